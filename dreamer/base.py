@@ -3,19 +3,21 @@
 """The core of Dreamer, containing the base Module class."""
 
 import argparse
-import json
+import functools
+import hashlib
 import logging
+import os
 import pathlib
 import shutil
 import subprocess
 import sys
 
-from typing import Any, Dict, List, Mapping, Optional, Tuple, Union
+from typing import Any, Dict, List, Mapping, Optional, Tuple, Type, Union
 
 from .exceptions import DreamerException, ProgrammerError
 from .providers.base import AbstractFileProvider
 from .runconfig import RunConfig, TerraformRunConfig
-from .utils import git_branch, prompt, quote, replace_block, run
+from .utils import atomic_write, dump_json, get_cache_dir, git_branch, load_json, prompt, replace_block_text, run
 
 
 VARIABLE_EXPORT_FN = 'export.tfvars'
@@ -25,6 +27,36 @@ VARIABLE_INTERNAL_FN = 'variables.tfvars'
 """The standard filename for the internally used Terraform variable cache (variable names always without a prefix)."""
 
 
+@functools.lru_cache(maxsize=None)
+def _parse_state_path(path: Tuple[str, ...]) -> Tuple[Tuple[str, Optional[int]], ...]:
+    """
+    Parse a `Module.get_state()` path into a tuple of `(key, index)` pairs, where `index` is None for plain keys, e.g.
+    `('modules[0]', 'resources')` -> `(('modules', 0), ('resources', None))`.
+    """
+    tokens: List[Tuple[str, Optional[int]]] = []
+    for piece in path:
+        if piece.endswith(']'):
+            idx_pos = piece.rfind('[')
+            tokens.append((piece[:idx_pos], int(piece[idx_pos + 1 : -1])))
+        else:
+            tokens.append((piece, None))
+    return tuple(tokens)
+
+
+MODULE_REGISTRY: Dict[str, Type['Module']] = {}
+"""All direct subclasses of `Module` as <friendly name> -> <class>, registered when the subclass is defined."""
+
+
+@functools.lru_cache(maxsize=None)
+def _module_filenames(friendly_name: str) -> Tuple[str, str, str]:
+    """
+    Return the Terraform plan, state and state backup filenames for the given module name. Cached so that all instances
+    of a module share the same strings.
+    """
+    state_fn = f'{friendly_name}.tfstate'
+    return f'{friendly_name}.tfplan', state_fn, f'{state_fn}.backup'
+
+
 class Module:
     """
     The base module for all Dreamer modules, providing reasonable defaults for a Terraform and Ansible project.
@@ -56,8 +88,9 @@ class Module:
     }
     """
     A dict of <Terraform output name> -> <filename>. Outputs are stored in the Dreamer state directory using the given
-    filename without any added suffix, typically located in `$DREAMER_BASE_DIR/module/project/`. The two outputs
-    defined here are required for the default steps, but can be removed in a child class if necessary.
+    filename without any added suffix, typically located in `$DREAMER_BASE_DIR/module/project/`. String outputs are
+    stored as-is and other outputs as JSON. The two outputs defined here are required for the default steps, but can be
+    removed in a child class if necessary.
     """
 
     ansible_args: str = ''
@@ -69,7 +102,8 @@ class Module:
     requirements_path: str = 'ansible/requirements.yml'
     """
     The (relative) path to the Ansible Galaxy requirements file. If the file exists, the requirements are imported
-    when Ansible is run.
+    when Ansible is run. Successful installs are remembered by the hash of the file in the Dreamer cache directory
+    (`~/.cache/dreamer/galaxy/` by default), so the same requirements are only installed once.
     """
 
     export_variable_prefix: str = ''
@@ -100,6 +134,15 @@ class Module:
     parser: Optional[argparse.ArgumentParser] = None
     """An optional ArgumentParser or subclass instance used to parse unparsed command-line arguments."""
 
+    _module_path_cache: Dict[str, pathlib.Path] = {}
+    """A cache of <Python module name> -> <resolved module directory>, shared by all Module subclasses."""
+
+    def __init_subclass__(cls, **kwargs: Any) -> None:
+        """Register direct subclasses in `MODULE_REGISTRY`, mirroring what `Module.__subclasses__()` would return."""
+        super().__init_subclass__(**kwargs)
+        if Module in cls.__bases__:
+            MODULE_REGISTRY[cls.friendly_name] = cls
+
     def __init__(self, name: str, file_provider: AbstractFileProvider, tf_config: TerraformRunConfig,
                  ansible_config: RunConfig, additional_args: Optional[List[str]]) -> None:
         """
@@ -121,15 +164,14 @@ class Module:
             if filename in (VARIABLE_EXPORT_FN, VARIABLE_INTERNAL_FN):
                 raise ProgrammerError(f'Forbidden filename specified for output "{output}": {filename}')
 
-        # Parse the absolute path to the module and the Ansible files
-        self.module_path = pathlib.Path(sys.modules[self.__module__].__file__).parent.resolve()
-        self.playbook_path_abs = (self.module_path / self.playbook_path).resolve()
-        self.requirements_path_abs = (self.module_path / self.requirements_path).resolve()
+        # Parse the absolute path to the module and the Ansible files. The module path is already resolved, so joining
+        # a relative path to it only needs resolving if the relative path contains "..".
+        self.module_path = self._resolve_module_path(self.__module__)
+        self.playbook_path_abs = self._join_module_path(self.playbook_path)
+        self.requirements_path_abs = self._join_module_path(self.requirements_path)
 
         # Terraform plan and state filename, and a list of all output files
-        self.plan_fn = f'{self.friendly_name}.tfplan'
-        self.state_fn = f'{self.friendly_name}.tfstate'
-        self.state_backup_fn = f'{self.state_fn}.backup'
+        self.plan_fn, self.state_fn, self.state_backup_fn = _module_filenames(self.friendly_name)
         self.files = list(self.outputs.values()) + [self.plan_fn, self.state_fn, self.state_backup_fn]
 
         # Add the current Git branch as a Terraform variable
@@ -137,17 +179,36 @@ class Module:
         self.terraform_vars['git_branch'] = current_branch if current_branch is not None else ""
 
         # Update the Terraform run configuration with the Terraform variables
-        for variable_name, variable_value in self.terraform_vars.items():
-            self.tf_config = self.tf_config.with_environment(f'TF_VAR_{variable_name}', variable_value)
+        self.tf_config = self.tf_config.with_environments(
+            {f'TF_VAR_{variable_name}': variable_value for variable_name, variable_value in self.terraform_vars.items()}
+        )
 
         # Update the Terraform run configuration to include the `-chdir` argument pointing at our module path
-        self._tf_chdir_param = f'-chdir="{quote(self.module_path)}"'
+        self._tf_chdir_param = f'-chdir={self.module_path}'
         self.tf_config = self.tf_config.with_global_arguments(self._tf_chdir_param)
 
         # State caches
-        self._tfstate: Mapping[str, Any] = {}
+        # The parsed state along with the modification time of the state file it was parsed from
+        self._tfstate: Optional[Tuple[int, Mapping[str, Any]]] = None
+        # The local state file paths as fetched from the provider, keyed by whether they are writable
+        self._state_paths: Dict[bool, pathlib.Path] = {}
         self._requirements_installed = False
 
+    @classmethod
+    def _resolve_module_path(cls, module_name: str) -> pathlib.Path:
+        """Return the resolved directory of the given Python module, resolving it only once per module."""
+        if module_name not in cls._module_path_cache:
+            path = pathlib.Path(sys.modules[module_name].__file__).parent.resolve()
+            cls._module_path_cache[module_name] = path
+        return cls._module_path_cache[module_name]
+
+    def _join_module_path(self, relative_path: str) -> pathlib.Path:
+        """Return the absolute path of the given path relative to the module directory."""
+        path = self.module_path / relative_path
+        if '..' in path.parts:
+            return path.resolve()
+        return path
+
     @property
     def ansible_config(self) -> RunConfig:
         """
@@ -156,20 +217,31 @@ class Module:
         FileProvider.get() would raise an exception.
         """
         return self._ansible_config.with_arguments(
-            f'-i {quote(self.get_output("ansible_hosts"))}'
+            '-i', str(self.get_output('ansible_hosts'))
         ).with_child_arguments(
-            'ANSIBLE_SSH_ARGS', f'-F {quote(self.get_output("ssh_config"))}'
+            'ANSIBLE_SSH_ARGS', '-F', str(self.get_output('ssh_config'))
         )
 
     def tf_config_with_state(self, *, writable: bool = False) -> RunConfig:
         """
         Convenience property for getting the Terraform run configuration with the state file.
         """
-        if writable:
-            fn = self.provider.get_rw(self.state_fn)
-        else:
-            fn = self.provider.get(self.state_fn)
-        return self.tf_config.with_arguments(f'-state={quote(fn)}')
+        return self.tf_config.with_arguments(f'-state={self.get_state_path(writable=writable)}')
+
+    def get_state_path(self, *, writable: bool = False) -> pathlib.Path:
+        """
+        Return the local path of the Terraform state file. The path is only fetched from the provider once for reading
+        and once for writing; after the latter, the writable copy is also used for reading.
+        """
+        path = self._state_paths.get(True)
+        if path is None:
+            if writable:
+                path = self._state_paths[True] = self.provider.get_rw(self.state_fn)
+            else:
+                path = self._state_paths.get(False)
+                if path is None:
+                    path = self._state_paths[False] = self.provider.get(self.state_fn)
+        return path
 
     def get_output(self, name: str, *, writable: bool = False) -> pathlib.Path:
         """A convenience method for getting the path of a Terraform output."""
@@ -183,18 +255,17 @@ class Module:
         `self.get_state('modules[0]', 'resources', 'aws_instance.vm', 'primary', 'attributes', 'public_ip')` - yes, this
         is verbose, but that is how they are stored in the Terraform state.
         Does not catch exceptions, so be prepared to catch KeyErrors.
+        The parsed state is cached, and only re-read if the state file has been modified since it was last parsed.
         """
-        if not self._tfstate:
-            with open(self.provider.get(self.state_fn), 'r') as file_:
-                self._tfstate = json.load(file_)
-        current = self._tfstate
-        for piece in path:
-            if piece.endswith(']'):
-                idx_pos = piece.rfind('[')
-                piece, item = piece[:idx_pos], piece[idx_pos + 1 : -1]
-                current = current[piece][int(item)]
-            else:
-                current = current[piece]
+        state_path = self.get_state_path()
+        mtime = state_path.stat().st_mtime_ns
+        if self._tfstate is None or self._tfstate[0] != mtime:
+            self._tfstate = (mtime, load_json(state_path.read_bytes()))
+        current = self._tfstate[1]
+        for key, index in _parse_state_path(path):
+            current = current[key]
+            if index is not None:
+                current = current[index]
         return current
 
     def load_parents(self, parents: Dict[str, str]) -> None:
@@ -220,20 +291,19 @@ class Module:
 
         for module, name in parents.items():
             path = self.provider.get(VARIABLE_EXPORT_FN, module=module, project=name)
-            self.tf_config = self.tf_config.with_arguments(f'-var-file={quote(path)}')
+            self.tf_config = self.tf_config.with_arguments(f'-var-file={path}')
 
     def pull(self) -> None:
         """
         Pull the state to a directory called `state` in the current directory. Note that the state is not automatically
         updated, but is a static copy of the current state.
         """
-        files = self.provider.get_files(self.project_name, self.friendly_name)
         output = pathlib.Path(f'./state-{self.friendly_name}-{self.project_name}')
         if not output.exists():
             self.logger.info('Created: %s', output)
             output.mkdir()
-        for fn in files:
-            file_ = self.provider.get(fn)
+        # Let the provider fetch all files at once, allowing remote providers to download them in parallel
+        for fn, file_ in self.provider.fetch_files(self.project_name, self.friendly_name):
             shutil.copy(file_, output)
             self.logger.info('Copied: %s -> %s', fn, output / file_.name)
 
@@ -246,35 +316,34 @@ class Module:
         """
         cfg = TerraformRunConfig(
             global_arguments=[self._tf_chdir_param],
-            arguments=['-json', quote(plan_path)],
+            arguments=['-json', str(plan_path)],
         )
 
         # Purposefully do not catch exceptions
-        output = subprocess.check_output(cfg.get_cmdline('terraform', 'show'), shell=True)
-        variables = json.loads(output.strip())['variables']
+        output = subprocess.run(cfg.get_argv('terraform', 'show'), stdout=subprocess.PIPE, check=True).stdout
+        variables = load_json(output)['variables']
 
         # Create the output
-        export_output = ''
-        internal_output = ''
+        export_lines = []
+        internal_lines = []
         for k, v in variables.items():
             value = v['value']  # Terraform escapes quotes for us, at least currently
-            export_output += f'{self.export_variable_prefix}{k} = "{value}"\n'
-            internal_output += f'{k} = "{value}"\n'
+            export_lines.append(f'{self.export_variable_prefix}{k} = "{value}"\n')
+            internal_lines.append(f'{k} = "{value}"\n')
 
+        # Build the new contents in memory and swap them in atomically, so an interrupted run never leaves a truncated
+        # variable file behind
         export_fn = self.provider.get_rw(VARIABLE_EXPORT_FN)
-        internal_fn = self.provider.get_rw(VARIABLE_INTERNAL_FN)
-        with open(export_fn, 'r+') as export_fh:
-            replace_block(export_fh, 'export', export_output)
-        with open(internal_fn, 'w') as internal_fh:
-            internal_fh.write(internal_output)
+        atomic_write(export_fn, replace_block_text(export_fn.read_text(), 'export', ''.join(export_lines)))
+        atomic_write(self.provider.get_rw(VARIABLE_INTERNAL_FN), ''.join(internal_lines))
 
     def plan(self) -> None:
         """Run the planning step of Terraform, producing the `name.tfplan` file in the state directory."""
         plan_path = self.provider.get_rw(self.plan_fn)
         cfg = self.tf_config_with_state(writable=True).with_arguments(
-            f'-out={quote(plan_path)}'
+            f'-out={plan_path}'
         )
-        run(cfg.get_cmdline('terraform', 'plan'))
+        run(cfg.get_argv('terraform', 'plan'), cfg.get_env())
         self.write_variables(plan_path)
 
     def apply(self) -> None:
@@ -284,11 +353,11 @@ class Module:
         cfg = TerraformRunConfig(
             global_arguments=[self._tf_chdir_param],
             arguments=[
-                f'-state-out={quote(self.provider.get_rw(self.state_fn))}',
-                quote(self.provider.get(self.plan_fn)),
+                f'-state-out={self.get_state_path(writable=True)}',
+                str(self.provider.get(self.plan_fn)),
             ],
         )
-        run(cfg.get_cmdline('terraform', 'apply'))
+        run(cfg.get_argv('terraform', 'apply'))
 
     def output(self) -> None:
         """Generate and store all outputs of Terraform given in `self.outputs`."""
@@ -297,7 +366,7 @@ class Module:
         cfg = TerraformRunConfig(
             global_arguments=[self._tf_chdir_param],
             arguments=[
-                f'-state={quote(self.provider.get(self.state_fn))}',
+                f'-state={self.get_state_path()}',
                 '-no-color',
                 '-json',
             ]
@@ -309,22 +378,29 @@ class Module:
         else:
             export_outputs = (self.export_outputs,)
 
+        # Fetch all outputs with a single Terraform invocation: {output_name: {"sensitive": ..., "value": ...}}
+        output = subprocess.check_output(cfg.get_argv('terraform', 'output'))
+        all_outputs = load_json(output)
+
+        export_blocks = {}
         for output_name, fn in self.outputs.items():
+            if output_name not in all_outputs:
+                raise DreamerException(f'Terraform output "{output_name}" not found in the state')
             self.logger.info('Writing output %s to %s', output_name, fn)
-            output_path = self.provider.get_rw(fn)
-            output = subprocess.check_output(
-                cfg.with_arguments(quote(output_name)).get_cmdline('terraform', 'output'),
-                shell=True
-            )
-            parsed = json.loads(output.strip())
-            with open(output_path, 'w') as f:
-                f.write(str(parsed))
-
+            # String outputs (the common case) are written as-is, anything else as JSON
+            value = all_outputs[output_name]['value']
+            content = value if isinstance(value, str) else dump_json(value)
+            atomic_write(self.provider.get_rw(fn), content)
             if output_name in export_outputs:
-                export_path = self.provider.get_rw(VARIABLE_EXPORT_FN)
-                with open(export_path, 'r+') as export_fh:
-                    content = open(output_path, 'r').read()
-                    replace_block(export_fh, f'output: {output_name}', content)
+                export_blocks[f'output: {output_name}'] = content
+
+        # Update all exported outputs with a single read and write of the export file
+        if export_blocks:
+            export_path = self.provider.get_rw(VARIABLE_EXPORT_FN)
+            export_content = export_path.read_text()
+            for block_name, content in export_blocks.items():
+                export_content = replace_block_text(export_content, block_name, content)
+            atomic_write(export_path, export_content)
         self.provider.sync()
 
     def ansible(self) -> None:
@@ -333,11 +409,38 @@ class Module:
         inventory file.
         """
         if self.requirements_path_abs.exists() and not self._requirements_installed:
-            self.logger.info('Installing Ansible requirements')
-            # --force for the win
-            run(f'ansible-galaxy install --force --ignore-errors -r {self.requirements_path_abs}')
+            marker = self._requirements_marker()
+            if marker.exists() and not os.environ.get('DREAMER_REINSTALL_REQUIREMENTS'):
+                self.logger.info('Ansible requirements already installed')
+            else:
+                self.logger.info('Installing Ansible requirements')
+                # --force for the win
+                install = ['ansible-galaxy', 'install', '--force', '-r', str(self.requirements_path_abs)]
+                try:
+                    run(install)
+                except subprocess.CalledProcessError:
+                    # Carry on with whatever could be installed, but without a marker, so the next run tries again
+                    self.logger.warning('Installing some Ansible requirements failed, retrying while ignoring errors')
+                    run(install[:-2] + ['--ignore-errors'] + install[-2:])
+                else:
+                    marker.parent.mkdir(parents=True, exist_ok=True)
+                    marker.touch()
             self._requirements_installed = True
-        run(self.ansible_config.get_cmdline('ansible-playbook', quote(self.playbook_path_abs)))
+        cfg = self.ansible_config
+        run(cfg.get_argv('ansible-playbook', str(self.playbook_path_abs)), cfg.get_env())
+
+    def _requirements_marker(self) -> pathlib.Path:
+        """
+        Return the path of the marker file recording that the Ansible requirements have been installed. The name is a
+        digest of the requirements and of everything that decides where `ansible-galaxy` puts the roles (the Python
+        environment, the home and working directories and the Ansible roles path and configuration), so switching any
+        of them installs the requirements again.
+        """
+        digest = hashlib.blake2b(self.requirements_path_abs.read_bytes(), digest_size=16)
+        for value in (sys.prefix, os.path.expanduser('~'), os.getcwd(),
+                      os.environ.get('ANSIBLE_ROLES_PATH', ''), os.environ.get('ANSIBLE_CONFIG', '')):
+            digest.update(b'\0' + value.encode())
+        return get_cache_dir() / 'galaxy' / f'{digest.hexdigest()}.installed'
 
     def destroy(self) -> None:
         """
@@ -351,7 +454,7 @@ class Module:
         except FileNotFoundError:
             self.logger.warning('Terraform variable cache not found, trying without')
             cfg = self.tf_config_with_state(writable=True)
-        run(cfg.get_cmdline('terraform', 'destroy'))
+        run(cfg.get_argv('terraform', 'destroy'), cfg.get_env())
 
     def cleanup(self) -> None:
         """
@@ -22,7 +22,7 @@ from .providers.base import AbstractFileProvider
 from .providers.local import LocalFileProvider
 from .pseudo_modules import PseudoModule
 from .runconfig import RunConfig, TerraformRunConfig
-from .utils import ColorFormatter
+from .utils import ColorFormatter, get_cache_dir, ssh_agent_identity_count
 
 AnyModule = Union[Module, PseudoModule]
 
@@ -120,8 +120,12 @@ def verify_ssh_agent(given_ssh_key: Optional[str], logger: logging.Logger) -> No
         logger.error('If you really know what you are doing, run Dreamer with `--no-agent`')
         sys.exit(1)
     else:
-        result = subprocess.run(['ssh-add', '-L'], capture_output=True, check=False)
-        if result.returncode != 0:
+        try:
+            has_identities = ssh_agent_identity_count(os.environ['SSH_AUTH_SOCK']) > 0
+        except (OSError, ValueError):
+            result = subprocess.run(['ssh-add', '-L'], capture_output=True, check=False)
+            has_identities = result.returncode == 0
+        if not has_identities:
             logger.warning('Warning: There are no identities loaded to ssh-agent.')
             ssh_add_params = f' "{given_ssh_key}"' if given_ssh_key else ''
             logger.warning(f'Consider running `ssh-add{ssh_add_params}` or the equivalent.')
@@ -133,9 +137,9 @@ def get_runconfigs(args: argparse.Namespace) -> Tuple[TerraformRunConfig, RunCon
     Returns a tuple of (tf_config, ansible_config).
     """
     tf_config = TerraformRunConfig(
-        arguments=[f'-var-file={shlex.quote(fn)}' for fn in args.var_files]
+        arguments=[f'-var-file={fn}' for fn in args.var_files]
     )
-    ssh_args = RunConfig(arguments=[f'-i {shlex.quote(args.ssh_key)}']) if args.ssh_key else RunConfig()
+    ssh_args = RunConfig(arguments=['-i', args.ssh_key]) if args.ssh_key else RunConfig()
     ansible_config = RunConfig(environment={
         'ANSIBLE_SSH_RETRIES': '3',
         'ANSIBLE_SSH_ARGS': ssh_args
@@ -143,10 +147,10 @@ def get_runconfigs(args: argparse.Namespace) -> Tuple[TerraformRunConfig, RunCon
 
     # Add the manually given additional arguments
     if args.terraform_args:
-        tf_config = tf_config.with_arguments(args.terraform_args)
+        tf_config = tf_config.with_arguments(*shlex.split(args.terraform_args))
 
     if args.ansible_args:
-        ansible_config = ansible_config.with_arguments(args.ansible_args)
+        ansible_config = ansible_config.with_arguments(*shlex.split(args.ansible_args))
 
     return tf_config, ansible_config
 
@@ -230,7 +234,10 @@ def main() -> None:
     # Instantiate the file provider
     file_provider: AbstractFileProvider
     if args.base_dir.startswith('s3://'):
-        file_provider = AWSFileProvider(args.base_dir)
+        # The persistent local cache of the remote state is opt-in, as it leaves the state files on disk
+        file_provider = AWSFileProvider(
+            args.base_dir, cache_dir=get_cache_dir() / 's3' if os.environ.get('DREAMER_S3_CACHE') else None
+        )
     else:
         file_provider = LocalFileProvider(args.base_dir)
 
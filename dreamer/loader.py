@@ -2,61 +2,109 @@
 
 import importlib.machinery
 import logging
-import os.path
 import sys
 
+from concurrent.futures import ThreadPoolExecutor
+from itertools import chain
 from pathlib import Path
-from typing import Dict, List, Tuple, Type
-from types import ModuleType
+from typing import Dict, List, Optional, Tuple, Type
+from types import CodeType, ModuleType
 
 from . import Module
-from .pseudo_modules import PseudoModule
+from .base import MODULE_REGISTRY
+from .pseudo_modules import PSEUDO_MODULE_REGISTRY, PseudoModule
 
 class ModuleLoader:
     """
-    A convenience class for importing modules by path. In our case, just importing the module and keeping a reference
-    to it is enough to populate Module.__subclasses__(). Note that a reference *must* be kept, because subclass
-    references are weak and thus do not actually keep the subclass loaded by themselves.
+    A convenience class for importing modules by path. In our case, just importing the module is enough to register
+    its Module subclasses in `MODULE_REGISTRY`. A reference to the module is kept as well, so that the module itself
+    stays loaded along with its classes.
     """
 
     def __init__(self) -> None:
         self.modules: List[ModuleType] = []
 
-    def load_module(self, module_path: Path) -> None:
-        """Load a module, storing it in self.modules"""
+    @staticmethod
+    def compile_module(module_path: Path) -> CodeType:
+        """
+        Read and compile a module (or load its cached bytecode) without executing it. Unlike executing the module, this
+        is safe to do in parallel.
+        """
         module_name = module_path.parent.name + '.dream'
         loader = importlib.machinery.SourceFileLoader(module_name, str(module_path))
-        module = ModuleType(loader.name)
-        loader.exec_module(module)
+        code = loader.get_code(module_name)
+        if code is None:
+            raise ImportError(f'Unable to load module code from {module_path}')
+        return code
+
+    def load_module(self, module_path: Path, code: Optional[CodeType] = None) -> None:
+        """Load a module, storing it in self.modules. If `code` is not given, the module is compiled first."""
+        module_name = module_path.parent.name + '.dream'
+        if code is None:
+            code = self.compile_module(module_path)
+        module = ModuleType(module_name)
+        exec(code, module.__dict__)  # pylint: disable=exec-used
         sys.modules[module_name] = module
-        module.__file__ = str(os.path.abspath(module_path))
+        module.__file__ = str(module_path.absolute())
         self.modules.append(module)
 
 
-def load_modules(base_paths: List[Path],
-                 module_files: List[Path]) -> Tuple[ModuleLoader, Dict[str, Type[Module]], Dict[str, Type[PseudoModule]]]:
+def _find_in_base_path(path: Path) -> List[Path]:
+    """Find the module files in the given directory and its immediate subdirectories."""
+    paths = []
+    module = path / 'dream.py'
+    if module.exists():
+        paths.append(module)
+    paths.extend(path.glob('*/dream.py'))
+    return paths
+
+
+def find_module_files(base_paths: List[Path], module_files: List[Path]) -> List[Path]:
     """
-    Load all modules from the given directory and its immediate subdirectories. The `ModuleLoader` instance returned
-    by this function must not be garbage collected to keep references to the actual modules around long enough.
-    Returns a tuple of (loader, module_map, pseudomodule_map).
+    Find all module files in the given directories and their immediate subdirectories, followed by the explicitly given
+    module files. The returned paths are resolved, and a module file found more than once is only returned once.
     """
     logger = logging.getLogger('dreamer.cli.load_modules')
-    loader = ModuleLoader()
-
+    base_paths = [path.expanduser() for path in base_paths]
     for path in base_paths:
-        path = path.expanduser()
         logger.debug('Finding modules in %s', path)
-        module = path / 'dream.py'
-        if module.exists():
-            loader.load_module(module)
-        for child_path in path.glob('*/dream.py'):
-            loader.load_module(child_path)
 
-    if module_files:
-        for fn in module_files:
-            loader.load_module(fn)
+    # Searching the directories is IO-bound, so do it in parallel
+    if len(base_paths) > 1:
+        with ThreadPoolExecutor(max_workers=min(32, len(base_paths))) as executor:
+            found = list(executor.map(_find_in_base_path, base_paths))
+    else:
+        found = [_find_in_base_path(path) for path in base_paths]
+
+    paths = []
+    seen = set()
+    for path in chain.from_iterable(found + [module_files]):
+        path = path.resolve()
+        if path not in seen:
+            seen.add(path)
+            paths.append(path)
+    return paths
+
+
+def load_modules(
+    base_paths: List[Path], module_files: List[Path]
+) -> Tuple[ModuleLoader, Dict[str, Type[Module]], Dict[str, Type[PseudoModule]]]:
+    """
+    Load all modules from the given directory and its immediate subdirectories. The `ModuleLoader` instance returned
+    by this function must not be garbage collected to keep references to the actual modules around long enough.
+    Returns a tuple of (loader, module_map, pseudomodule_map).
+    """
+    loader = ModuleLoader()
+    paths = find_module_files(base_paths, module_files)
 
-    modules = {m.friendly_name: m for m in Module.__subclasses__()}
-    pseudo_modules = {pm.friendly_name: pm for pm in PseudoModule.__subclasses__()}
+    # Reading and compiling the modules is independent work, so do it in parallel; executing them is done serially in
+    # discovery order, as it registers the Module subclasses and mutates `sys.modules`
+    if len(paths) > 1:
+        with ThreadPoolExecutor(max_workers=min(32, len(paths))) as executor:
+            codes = list(executor.map(loader.compile_module, paths))
+    else:
+        codes = [loader.compile_module(path) for path in paths]
+    for path, code in zip(paths, codes):
+        loader.load_module(path, code)
 
-    return loader, modules, pseudo_modules
+    return loader, dict(MODULE_REGISTRY), dict(PSEUDO_MODULE_REGISTRY)
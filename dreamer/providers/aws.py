@@ -2,44 +2,206 @@
 
 import configparser
 import datetime
+import fcntl
+import hashlib
 import json
 import logging
 import os
 import os.path
-import re
 import tempfile
 import traceback
 
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from shutil import rmtree
 from types import TracebackType
 from typing import Any, Dict, List, Optional, Set, Tuple, Type
 
 from dreamer.exceptions import DreamerException, ProgrammerError
+from dreamer.utils import atomic_write
 
 from .base import AbstractFileProvider
 from .utils import _get, whoami
 
 
-class AWSFileProvider(AbstractFileProvider):
+class _S3Transfer:
     """
-    Store the state remotely in AWS. Works by using a temporary directory, and tries to handle a lot of edge cases,
-    status changes, cache invalidation and other trickery.
+    The S3 client and the transfer settings shared by all downloads and uploads. boto3 is slow to import, so it is only
+    imported and the client created on first use.
     """
 
-    def __init__(self, base_dir: str, default_module: Optional[str] = None,
-                 default_project: Optional[str] = None) -> None:
-        super().__init__(base_dir, default_module, default_project)
-        self.logger = logging.getLogger('AWSFileProvider')
+    def __init__(self) -> None:
+        self._client: Any = None
+        self.config: Any = None
+        self._create_transfer_manager: Any = None
+        self.ClientError: Any = Exception  # pylint: disable=invalid-name
+
+    def ensure_boto3(self) -> None:
+        """Import boto3 and create the S3 client and transfer configuration, unless already done."""
+        if self._client is not None:
+            return
 
         # pylint: disable=import-outside-toplevel
         try:
             import boto3
-            from boto3.s3.transfer import S3Transfer
+            from boto3.s3.transfer import TransferConfig, create_transfer_manager
+            from botocore.config import Config
             from botocore.exceptions import ClientError
         except ImportError as e:
             raise ImportError('Please install boto3 to use the remote state.') from e
 
+        # Use multipart transfers for anything above a few megabytes, such as large Terraform state files
+        self.config = TransferConfig(
+            multipart_threshold=8 * 1024 * 1024,
+            multipart_chunksize=16 * 1024 * 1024,
+            max_concurrency=10,
+            max_io_queue=1000,
+            io_chunksize=256 * 1024,
+            use_threads=True,
+        )
+        self.ClientError = ClientError
+        self._create_transfer_manager = create_transfer_manager
+        # Allow enough pooled connections for the parallel transfers in `fetch_files()` and `sync()`
+        self._client = boto3.client('s3', config=Config(max_pool_connections=32))
+
+    @staticmethod
+    def is_missing(error: Any) -> bool:
+        """Return whether the given ClientError means that the object does not exist (as opposed to e.g. no access)."""
+        return error.response.get('Error', {}).get('Code') in ('404', 'NoSuchKey', 'NotFound')
+
+    @property
+    def client(self) -> Any:
+        """Return the S3 client, importing boto3 and creating the client on first use."""
+        self.ensure_boto3()
+        return self._client
+
+    def download(self, bucket: str, key: str, file_path: Path) -> None:
+        """Download the given S3 object to the given local path."""
+        self.client.download_file(bucket, key, str(file_path), Config=self.config)
+
+    def transfer_manager(self) -> Any:
+        """
+        Return a transfer manager for running many uploads concurrently. It uses the CRT-based transfer client instead
+        of the pure Python one if boto3 decides it is available and preferable.
+        """
+        return self._create_transfer_manager(self.client, self.config)
+
+
+class _EtagCache:
+    """
+    Bookkeeping for the persistent local cache: a sidecar file next to each cached file stores the S3 ETag of the
+    object the file was downloaded from or uploaded to.
+
+    Concurrent runs would overwrite each other's cached files and ETags, so the cache directory is locked for as long
+    as the cache is open, and opening a cache that is already in use fails.
+    """
+
+    def __init__(self, local_dir: Path) -> None:
+        self._lock_fd = os.open(local_dir / '.lock', os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            fcntl.flock(self._lock_fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError as e:
+            os.close(self._lock_fd)
+            raise DreamerException(f'The local S3 state cache {local_dir} is in use by another Dreamer run') from e
+
+    def close(self) -> None:
+        """Release the lock on the cache directory."""
+        os.close(self._lock_fd)
+
+    @staticmethod
+    def path(file_path: Path) -> Path:
+        """Return the path of the sidecar file storing the ETag of the given cached file."""
+        return file_path.with_name(file_path.name + '.etag')
+
+    def is_current(self, file_path: Path, etag: str) -> bool:
+        """
+        Return whether the cache has an up-to-date copy of a file with the given remote ETag. Copies modified locally
+        after they were downloaded (i.e. after the ETag was stored) are never considered up to date.
+        """
+        etag_path = self.path(file_path)
+        try:
+            if file_path.stat().st_mtime_ns > etag_path.stat().st_mtime_ns:
+                return False
+            return etag_path.read_text() == etag
+        except FileNotFoundError:
+            return False
+
+    def store(self, file_path: Path, etag: str) -> None:
+        """Record the ETag of the S3 object the given cached file is a copy of."""
+        atomic_write(self.path(file_path), etag)
+
+    def refresh(self, file_path: Path) -> None:
+        """
+        Mark the stored ETag of a file that was rewritten locally without changing its contents as up to date again.
+        """
+        try:
+            os.utime(self.path(file_path))
+        except FileNotFoundError:
+            pass
+
+    def forget(self, file_path: Path) -> None:
+        """Remove a file and its stored ETag from the cache."""
+        file_path.unlink(missing_ok=True)
+        self.path(file_path).unlink(missing_ok=True)
+
+
+class _BucketIndex:
+    """
+    An index of the S3 bucket contents under the provider's prefix, as `{module: {project: {filename, ...}}}`, along
+    with the set of projects whose metadata object exists. Projects whose metadata object is missing but that still
+    have files are indexed as well, but do not count as existing.
+    """
+
+    def __init__(self) -> None:
+        self.files: Dict[str, Dict[str, Set[str]]] = {}
+        self.projects: Set[Tuple[str, str]] = set()
+
+    def add(self, project: str, module: str, fn: Optional[str] = None) -> None:
+        """Add a file (or the project metadata object, if `fn` is None) to the index."""
+        files = self.files.setdefault(module, {}).setdefault(project, set())
+        if fn is None:
+            self.projects.add((module, project))
+        else:
+            files.add(fn)
+
+    def remove(self, project: str, module: str, fn: Optional[str] = None) -> None:
+        """Remove a file (or the project metadata object, if `fn` is None) from the index."""
+        if fn is None:
+            self.projects.discard((module, project))
+        else:
+            self.files.get(module, {}).get(project, set()).discard(fn)
+        projects = self.files.get(module, {})
+        if project in projects and not projects[project] and (module, project) not in self.projects:
+            del projects[project]
+            if not projects:
+                del self.files[module]
+
+    def get_projects(self, module: str) -> List[str]:
+        """Return the existing projects in the given module."""
+        return sorted(project for project in self.files.get(module, {}) if (module, project) in self.projects)
+
+    def get_files(self, project: str, module: str) -> List[str]:
+        """Return the files of the given project in the given module."""
+        return sorted(self.files.get(module, {}).get(project, ()))
+
+
+class AWSFileProvider(AbstractFileProvider):
+    """
+    Store the state remotely in AWS. Works by using a temporary directory, and tries to handle a lot of edge cases,
+    status changes, cache invalidation and other trickery.
+    """
+    # The public methods are the file provider interface plus the remote versioning methods
+    # pylint: disable=too-many-public-methods
+
+    def __init__(self, base_dir: str, default_module: Optional[str] = None,
+                 default_project: Optional[str] = None, cache_dir: Optional[Path] = None) -> None:
+        """
+        If `cache_dir` is given, the files are kept in a persistent per-bucket cache under it instead of a temporary
+        directory, and cached files are only downloaded again if their S3 ETag has changed.
+        """
+        super().__init__(base_dir, default_module, default_project)
+        self.logger = logging.getLogger('AWSFileProvider')
+
         if not base_dir.startswith('s3://'):
             raise ProgrammerError('Invalid base directory given for AWSFileProvider')
 
@@ -49,7 +211,7 @@ class AWSFileProvider(AbstractFileProvider):
 
         # Terminology for reference:
         # S3 does not have directories or filenames, it has *keys* (which might contain forward slashes)
-        # local_dir is the temporary directory used to cache the files locally
+        # local_dir is the temporary (or persistent, if `cache_dir` is given) directory used to cache the files locally
         # Variables with `path` in them are `pathlib.Path` objects
         # fn is usually just the basename of the file we're handling
 
@@ -64,68 +226,130 @@ class AWSFileProvider(AbstractFileProvider):
         else:
             self.bucket = base_dir
             self.prefix = ''
-
-        self.client = boto3.client('s3')
-        self.transfer = S3Transfer(self.client)
-        self.local_dir = Path(tempfile.mkdtemp(prefix='dreamer-'))
+        self._base_url = f's3://{self.bucket}/{self.prefix}'
+
+        self._s3 = _S3Transfer()
+        # The ETag bookkeeping of the persistent cache, or None if a temporary directory is used
+        self._etags: Optional[_EtagCache] = None
+        if cache_dir is not None:
+            self.local_dir = cache_dir / hashlib.blake2b(self.base_dir.encode(), digest_size=16).hexdigest()
+            self.local_dir.mkdir(mode=0o700, parents=True, exist_ok=True)
+            self._etags = _EtagCache(self.local_dir)
+        else:
+            self.local_dir = Path(tempfile.mkdtemp(prefix='dreamer-'))
 
         self.dirty: Set[Path] = set()
-        self._bucket_contents: Optional[List[str]] = None
+        # Snapshots of dirty files as last fetched from or uploaded to S3, used to skip uploading unchanged files
+        self._pre_edit_state: Dict[Path, Tuple[int, int, Optional[bytes]]] = {}
+        # The bucket listing is only fetched once, see `_get_index()`
+        self._index: Optional[_BucketIndex] = None
+        # A cache of (module, project) -> (ETag, metadata) to avoid downloading unchanged project metadata again
+        self._metadata_cache: Dict[Tuple[str, str], Tuple[str, Dict[str, Any]]] = {}
         self.last_version: Optional[int] = None
 
         # Used to signify that `sync()` should not raise an error on version mismatch and should not try to write a new
         # metadata file to the S3 bucket.
         self._deleted_project = False
 
-        # Delayed imports make life harder
-        self._ClientError = ClientError  # pylint: disable=invalid-name
-
     # Helper methods
 
-    def _get_project_and_module(self, project: Optional[str] = None, module: Optional[str] = None) -> Tuple[str, str]:
-        """
-        Get the module and project. If None is given, the value is fetched from the corresponding default. If the
-        default is None as well, an exception is raised.
-        """
-        project = _get(project, self.default_project)
-        module = _get(module, self.default_module)
-        return project, module
+    @property
+    def client(self) -> Any:
+        """Return the S3 client, importing boto3 and creating the client on first use."""
+        return self._s3.client
 
-    def _ensure_local_path(self, project: Optional[str] = None, module: Optional[str] = None) -> Path:
+    # The helpers below take an already resolved project and module, see `_get_project_and_module()`
+
+    def _ensure_path(self, project: str, module: str) -> Path:
         """Ensure that the local path for the given project and module exists."""
-        project, module = self._get_project_and_module(project, module)
         base_path = self.local_dir / module / project
         base_path.mkdir(mode=0o700, parents=True, exist_ok=True)
         return base_path
 
-    def _get_s3_key(self, fn: str, project: Optional[str] = None, module: Optional[str] = None) -> str:
+    def _s3_key(self, fn: str, project: str, module: str) -> str:
         """Return the S3 object key for the given file in the given project and module."""
-        project, module = self._get_project_and_module(project, module)
         return self.prefix + '/'.join((module, project, fn))
 
-    def _get_local_path(self, fn: str, project: Optional[str] = None, module: Optional[str] = None) -> Path:
+    def _local_path(self, fn: str, project: str, module: str) -> Path:
         """Return the local path for the given file in the given project and module."""
-        project, module = self._get_project_and_module(project, module)
         return self.local_dir / module / project / fn
 
+    def _index_add(self, project: str, module: str, fn: Optional[str] = None) -> None:
+        """Add a file (or the project metadata object, if `fn` is None) to the bucket index, if it is already built."""
+        if self._index is not None:
+            self._index.add(project, module, fn)
+
+    def _index_remove(self, project: str, module: str, fn: Optional[str] = None) -> None:
+        """
+        Remove a file (or the project metadata object, if `fn` is None) from the bucket index, if it is already built.
+        """
+        if self._index is not None:
+            self._index.remove(project, module, fn)
+
+    def _get_remote_etag(self, key: str) -> Optional[str]:
+        """Return the ETag of the given S3 object, or None if the object does not exist."""
+        try:
+            return self.client.head_object(Bucket=self.bucket, Key=key)['ETag']
+        except self._s3.ClientError as e:
+            # Anything else, such as missing permissions, must not be mistaken for a missing file: `get_rw()` would
+            # then start from an empty file and upload it over the real one
+            if self._s3.is_missing(e):
+                return None
+            raise
+
+    @staticmethod
+    def _snapshot(file_path: Path) -> Tuple[int, int, Optional[bytes]]:
+        """
+        Return a snapshot of the given file for detecting changes to it: its size, modification time and, for files
+        smaller than a megabyte, a digest of its contents (so rewriting a small file with the same contents does not
+        count as a change).
+        """
+        stat = file_path.stat()
+        digest = None
+        if stat.st_size < 1024 * 1024:
+            digest = hashlib.blake2b(file_path.read_bytes(), digest_size=16).digest()
+        return stat.st_size, stat.st_mtime_ns, digest
+
+    def _is_modified(self, file_path: Path) -> bool:
+        """Return whether the given dirty file has changed since it was last fetched from or uploaded to S3."""
+        snapshot = self._pre_edit_state.get(file_path)
+        if snapshot is None:
+            return True
+        current = self._snapshot(file_path)
+        if current[2] is not None and snapshot[2] is not None:
+            return current[2] != snapshot[2]
+        return current[:2] != snapshot[:2]
+
     # Versioning methods
 
     def get_metadata(self, module: str, project: str) -> Dict[str, Any]:
-        """Get the full metadata dictionary of a project."""
+        """
+        Get the full metadata dictionary of a project. If the metadata is already cached, it is fetched with a
+        conditional request, so it is only downloaded again if its ETag has changed.
+        """
         key = self.prefix + module + '/' + project
-        base_path = self._ensure_local_path(project, module)
-        destination = str(base_path / 'meta.json')
-        self.transfer.download_file(self.bucket, key, destination)
-        with open(destination, 'rb') as f:
-            return json.load(f)
+        cached = self._metadata_cache.get((module, project))
+        try:
+            if cached is not None:
+                response = self.client.get_object(Bucket=self.bucket, Key=key, IfNoneMatch=cached[0])
+            else:
+                response = self.client.get_object(Bucket=self.bucket, Key=key)
+        except self._s3.ClientError as e:
+            if cached is not None and e.response.get('Error', {}).get('Code') == '304':
+                return cached[1]
+            raise
+        metadata = json.loads(response['Body'].read())
+        self._metadata_cache[(module, project)] = (response['ETag'], metadata)
+        return metadata
 
     def get_remote_version(self) -> Optional[int]:
         """Get the version of the remote state, or None if there is no remote state yet."""
         if self.default_module is None or self.default_project is None:
             raise DreamerException('get_remote_version() called without default_module and default_project set')
+        self._s3.ensure_boto3()
         try:
             return self.get_metadata(self.default_module, self.default_project)['version']
-        except self._ClientError:
+        except self._s3.ClientError:
             return None
 
     def open_project(self, module: str, project: str) -> None:
@@ -151,17 +375,20 @@ class AWSFileProvider(AbstractFileProvider):
         if self.default_module is None or self.default_project is None:
             raise DreamerException('sync_project() called without default_module and default_project set')
         key = self.prefix + '/'.join((self.default_module, self.default_project))
-        base_path = self._ensure_local_path(self.default_project, self.default_module)
+        base_path = self._ensure_path(self.default_project, self.default_module)
         fn = base_path / 'meta.json'
         if self.last_version is None:
             new_version = 0
         else:
             new_version = self.last_version + 1
-        json.dump({'version': new_version, 'author': whoami()}, fn.open('w'))
-        self.transfer.upload_file(
-            str(fn), self.bucket, key,
-            extra_args={'Metadata': {'Content-Type': 'application/json'}}
+        metadata = {'version': new_version, 'author': whoami()}
+        body = json.dumps(metadata)
+        response = self.client.put_object(
+            Bucket=self.bucket, Key=key, Body=body.encode(), ContentType='application/json'
         )
+        atomic_write(fn, body)
+        self._metadata_cache[(self.default_module, self.default_project)] = (response['ETag'], metadata)
+        self._index_add(self.default_project, self.default_module)
         return new_version
 
     # FileProvider method overrides
@@ -171,14 +398,29 @@ class AWSFileProvider(AbstractFileProvider):
         Fetch the file to the local state for reading. Raise an exception if the file is missing in the S3 bucket.
         Returns the path to the local copy of the file.
         """
-        base_path = self._ensure_local_path(project, module)
-        file_path = base_path / fn
-        if not file_path.exists():
-            key = self._get_s3_key(fn, project, module)
+        project, module = self._get_project_and_module(project, module)
+        cache_key = (module, project, fn)
+        if cache_key in self._get_cache:
+            return self._get_cache[cache_key]
+        file_path = self._ensure_path(project, module) / fn
+        key = self._s3_key(fn, project, module)
+        if self._etags is not None and file_path not in self.dirty:
+            # The persistent cache may contain stale copies from earlier runs, so check them against the remote ETag
+            etag = self._get_remote_etag(key)
+            if etag is None:
+                self._etags.forget(file_path)
+                raise FileNotFoundError(f's3://{self.bucket}/{key}')
+            if not self._etags.is_current(file_path, etag):
+                self._s3.download(self.bucket, key, file_path)
+                self._etags.store(file_path, etag)
+        elif not file_path.exists():
             try:
-                self.transfer.download_file(self.bucket, key, str(file_path))
-            except Exception as e:
-                raise FileNotFoundError(f's3://{self.bucket}/{key}') from e
+                self._s3.download(self.bucket, key, file_path)
+            except self._s3.ClientError as e:
+                if self._s3.is_missing(e):
+                    raise FileNotFoundError(f's3://{self.bucket}/{key}') from e
+                raise
+        self._get_cache[cache_key] = file_path
         return file_path
 
     def get_rw(self, fn: str, *, project: Optional[str] = None, module: Optional[str] = None) -> Path:
@@ -186,93 +428,152 @@ class AWSFileProvider(AbstractFileProvider):
         Fetch the file to the local state for reading and writing. If the file is missing in the S3 bucket, an empty
         file is initially created to prevent file not found errors etc.
         """
-        base_path = self._ensure_local_path(project, module)
-        file_path = base_path / fn
-        self.dirty = self.dirty | {file_path}
+        project, module = self._get_project_and_module(project, module)
+        file_path = self._ensure_path(project, module) / fn
         try:
             self.get(fn, project=project, module=module)
         except FileNotFoundError:
+            # New files are always uploaded, even if they are left empty
             file_path.touch()
+        else:
+            if file_path not in self.dirty:
+                self._pre_edit_state[file_path] = self._snapshot(file_path)
+        self.dirty.add(file_path)
         return file_path
 
-    @property
-    def bucket_contents(self) -> List[str]:
-        """Return all files in the S3 bucket matching the current prefix."""
-        if self._bucket_contents is None:
-            self._bucket_contents = []
-            paginator = self.client.get_paginator('list_objects')
+    def _get_index(self) -> _BucketIndex:
+        """Return the index of the S3 bucket contents under the current prefix, fetching the listing on first use."""
+        if self._index is None:
+            index = _BucketIndex()
+            paginator = self.client.get_paginator('list_objects_v2')
             results = paginator.paginate(
                 Bucket=self.bucket,
                 PaginationConfig={'PageSize': 1000},
                 Prefix=self.prefix
             )
+            prefix_len = len(self.prefix)
             for page in results:
-                for item in page.get("Contents", []):
-                    self._bucket_contents.append(item["Key"][len(self.prefix):])
-        return self._bucket_contents
+                for item in page.get('Contents', []):
+                    parts = item['Key'][prefix_len:].split('/', 2)
+                    if len(parts) == 2:
+                        index.add(parts[1], parts[0])
+                    elif len(parts) == 3:
+                        index.add(parts[1], parts[0], parts[2])
+            self._index = index
+        return self._index
 
     def get_modules(self) -> List[str]:
         """Return all modules present in the S3 bucket."""
-        # Kludge? Just show all files that have a project inside them.
+        # Kludge? Just show all modules that have a project inside them.
         # This might fail if the bucket has other content, but at this point it is not recommended in any case.
-        out = []
-        for key in self.bucket_contents:
-            parts = key.split('/')
-            if len(parts) == 2:
-                out.append(parts[0])
-        return sorted(list(set(out)))
+        index = self._get_index()
+        return sorted(module for module in index.files if index.get_projects(module))
 
     def get_projects(self, module: Optional[str] = None) -> List[str]:
         """Return all projects present in the S3 bucket in the given module."""
         module = _get(module, self.default_module)
-        out = []
-        for key in self.bucket_contents:
-            if re.match(rf'^{module}/[^/]+$', key):
-                out.append(key.split('/', 1)[1])
-        return out
+        return self._get_index().get_projects(module)
 
     def get_files(self, project: Optional[str] = None, module: Optional[str] = None) -> List[str]:
         """Return all files in the S3 bucket belonging to the given project in the given module."""
         project, module = self._get_project_and_module(project, module)
-        out = []
-        for key in self.bucket_contents:
-            if key.startswith(f'{module}/{project}/'):
-                out.append(key.split('/', 2)[2])
-        return out
+        return self._get_index().get_files(project, module)
+
+    def fetch_files(self, project: Optional[str] = None, module: Optional[str] = None) -> List[Tuple[str, Path]]:
+        """Download all files of the given project in the given module in parallel, using the cached bucket listing."""
+        project, module = self._get_project_and_module(project, module)
+        files = self.get_files(project, module)
+        if not files:
+            return []
+        with ThreadPoolExecutor(max_workers=min(32, len(files))) as executor:
+            paths = executor.map(lambda fn: self.get(fn, project=project, module=module), files)
+            return list(zip(files, paths))
 
     def delete(self, fn: str, *, project: Optional[str] = None, module: Optional[str] = None) -> None:
         project, module = self._get_project_and_module(project, module)
-        self.client.delete_object(Bucket=self.bucket, Key=self._get_s3_key(fn, project, module))
+        self._invalidate_cache(project, module, fn)
+        self.client.delete_object(Bucket=self.bucket, Key=self._s3_key(fn, project, module))
+        self._index_remove(project, module, fn)
+        if self._etags is not None:
+            self._etags.forget(self._local_path(fn, project, module))
 
     def delete_project(self, project: str, module: Optional[str] = None, recursive: bool = False) -> None:
         project, module = self._get_project_and_module(project, module)
         if project == self.default_project and module == self.default_module:
             self._deleted_project = True
+        self._invalidate_cache(project, module)
+        # S3 key -> filename, or None for the project metadata object
+        keys: Dict[str, Optional[str]] = {}
         if recursive:
-            for fn in self.get_files(project, module):
-                self.delete(fn, project=project, module=module)
-        self.client.delete_object(Bucket=self.bucket, Key='/'.join((self.prefix + module, project)))
+            keys = {self._s3_key(fn, project, module): fn for fn in self.get_files(project, module)}
+        keys['/'.join((self.prefix + module, project))] = None
+        key_list = list(keys)
+
+        # DeleteObjects accepts at most 1000 keys per request
+        errors = []
+        for i in range(0, len(key_list), 1000):
+            response = self.client.delete_objects(
+                Bucket=self.bucket,
+                Delete={'Objects': [{'Key': key} for key in key_list[i : i + 1000]], 'Quiet': True}
+            )
+            errors.extend(response.get('Errors', []))
+        failed = {error.get('Key') for error in errors}
+        for key, fn in keys.items():
+            if key not in failed:
+                self._index_remove(project, module, fn)
+        for error in errors:
+            self.logger.error('Failed to delete s3://%s/%s: %s', self.bucket, error.get('Key'), error.get('Message'))
+        if errors:
+            raise DreamerException(f'Failed to delete {len(errors)} object(s) from project {module}/{project}')
+        if self._etags is not None:
+            rmtree(self.local_dir / module / project, ignore_errors=True)
 
     def module_exists(self, module: str) -> bool:
-        # Directories don't exist in S3, so modules "always exist"
-        return True
+        # Directories don't exist in S3, so a module exists if it has a project in it, like in `get_modules()`
+        return bool(self._get_index().get_projects(module))
 
     def project_exists(self, project: str, module: Optional[str] = None) -> bool:
         project, module = self._get_project_and_module(project, module)
-        return f'{module}/{project}' in self.bucket_contents
+        return (module, project) in self._get_index().projects
 
     def sync(self) -> bool:
-        if self._deleted_project or not self.dirty:
-            # If we're deleting the project or there's no changes, don't sync anything
+        if self._deleted_project:
+            # If we're deleting the project, don't sync anything
+            return True
+        modified = [path for path in self.dirty if self._is_modified(path)]
+        if self._etags is not None:
+            for path in self.dirty.difference(modified):
+                self._etags.refresh(path)
+        if not modified:
+            # If there's no changes, don't sync anything either
             return True
 
         current_version = self.get_remote_version()
         if current_version != self.last_version:
             raise DreamerException('Critical: Remote state has been modified during our runtime!')
 
-        for path in self.dirty:
-            key = self.prefix + str(path.relative_to(self.local_dir))
-            self.transfer.upload_file(str(path), self.bucket, str(key), extra_args={'Metadata': {'author': whoami()}})
+        # A single transfer manager runs all the uploads concurrently
+        extra_args = {'Metadata': {'author': whoami()}}
+        with self._s3.transfer_manager() as manager:
+            futures = [
+                manager.upload(
+                    str(path), self.bucket, self.prefix + str(path.relative_to(self.local_dir)), extra_args=extra_args
+                )
+                for path in modified
+            ]
+            for future in futures:
+                future.result()
+        for path in modified:
+            self._pre_edit_state[path] = self._snapshot(path)
+            module, project, fn = path.relative_to(self.local_dir).parts
+            self._index_add(project, module, fn)
+        if self._etags is not None:
+            # Record the ETags of the uploaded files, so the next run does not download them again
+            with ThreadPoolExecutor(max_workers=min(32, len(modified))) as executor:
+                keys = [self.prefix + str(path.relative_to(self.local_dir)) for path in modified]
+                for path, etag in zip(modified, executor.map(self._get_remote_etag, keys)):
+                    if etag is not None:
+                        self._etags.store(path, etag)
         if self.default_module and self.default_project:
             self.last_version = self.sync_project()
         return True
@@ -283,13 +584,14 @@ class AWSFileProvider(AbstractFileProvider):
         return self.local_dir / self.default_module / self.default_project
 
     def get_base_url(self) -> str:
-        return f's3://{self.bucket}/{self.prefix}'
+        return self._base_url
 
     def url_for(self, fn: str, *, project: Optional[str] = None, module: Optional[str] = None) -> str:
-        return f's3://{self.bucket}/{self._get_s3_key(fn, project, module)}'
+        project, module = self._get_project_and_module(project, module)
+        return f'{self._base_url}{module}/{project}/{fn}'
 
     def url_for_project(self, project: str, module: str) -> str:
-        return f's3://{self.bucket}/{self.prefix}{module}/{project}/'
+        return f'{self._base_url}{module}/{project}/'
 
     def __enter__(self) -> None:
         # Nothing special to do here
@@ -297,14 +599,19 @@ class AWSFileProvider(AbstractFileProvider):
 
     def __exit__(self, exc_type: Optional[Type[BaseException]], exc_val: Optional[Exception],
                  exc_tb: Optional[TracebackType]) -> bool:
-        """Sync the remote state, and (only) on a clean exit remove the temporary directory."""
+        """
+        Sync the remote state, and (only) on a clean exit remove the temporary directory. A persistent cache directory
+        is never removed.
+        """
         local_exc = None
         try:
             self.sync()
         except Exception as exc:  # pylint: disable=broad-except
             local_exc = exc
+        if self._etags is not None:
+            self._etags.close()
 
-        if exc_type is None:
+        if exc_type is None and self._etags is None:
             rmtree(self.local_dir)
         if exc_type is not None or local_exc is not None:
             self.logger.error('An exception happened, so your local state has NOT been removed from %s', self.local_dir)
@@ -341,6 +648,7 @@ class AWSFileProvider(AbstractFileProvider):
 
         current_profile = session.profile_name
         current_expiration = None
+        now = datetime.datetime.now()
 
         if current_profile not in parser.sections():
             print(f'Current profile "{current_profile}" not found in ~/.aws/credentials')
@@ -356,16 +664,17 @@ class AWSFileProvider(AbstractFileProvider):
         longest_valid_credential = None
         longest_valid_expiration = None
         permanent_credentials = []
-        for section_name in parser.sections():
+        for section_name, data in parser.items():
+            if section_name == parser.default_section:
+                continue
             if section_name == current_profile:
                 prefix = 'current, '
             else:
                 prefix = ''
             expiration_text = 'permanent'
-            data = parser[section_name]
             if 'aws_credentials_expire_unix' in data:
                 expiration = datetime.datetime.fromtimestamp(int(data['aws_credentials_expire_unix']))
-                if expiration < datetime.datetime.now():
+                if expiration < now:
                     expiration_text = f'temporary, EXPIRED {expiration.isoformat()}'
                 else:
                     expiration_text = f'temporary, expires {expiration.isoformat()}'
@@ -379,7 +688,7 @@ class AWSFileProvider(AbstractFileProvider):
 
         print()
         if longest_valid_credential is not None:
-            if longest_valid_expiration < datetime.datetime.now():
+            if longest_valid_expiration < now:
                 if permanent_credentials:
                     if current_profile in permanent_credentials:
                         print('You are using permanent credentials (and all your temporary credentials ' +
@@ -398,7 +707,7 @@ class AWSFileProvider(AbstractFileProvider):
                     print('You are using permanent credentials, but there are also valid temporary ' +
                           'credentials available.')
                 else:
-                    if current_expiration < datetime.datetime.now():
+                    if current_expiration < now:
                         print('You are using expired credentials, but valid temporary credentials are ' +
                               'available. Did you mean to use the AWS profile "{longest_valid_credential}"?')
                     else:
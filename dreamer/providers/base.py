@@ -3,7 +3,7 @@
 from abc import ABCMeta, abstractmethod
 from pathlib import Path
 from types import TracebackType
-from typing import List, Optional, Type
+from typing import Dict, List, Optional, Tuple, Type
 
 
 class AbstractFileProvider:
@@ -17,9 +17,36 @@ class AbstractFileProvider:
 
     __metaclass__ = ABCMeta
 
+    default_module: Optional[str] = None
+    default_project: Optional[str] = None
+
     def __init__(self, base_dir: str, default_module: Optional[str] = None,
                  default_project: Optional[str] = None) -> None:
-        pass
+        # pylint: disable=unused-argument
+        # A cache of (module, project, filename) -> local path for files known to be available via `get()`
+        self._get_cache: Dict[Tuple[str, str, str], Path] = {}
+
+    def _invalidate_cache(self, project: str, module: str, fn: Optional[str] = None) -> None:
+        """Forget the cached `get()` result of the given file, or of all files in the project if `fn` is None."""
+        if fn is not None:
+            self._get_cache.pop((module, project, fn), None)
+        else:
+            for key in [key for key in self._get_cache if key[:2] == (module, project)]:
+                del self._get_cache[key]
+
+    def _get_project_and_module(self, project: Optional[str] = None, module: Optional[str] = None) -> Tuple[str, str]:
+        """
+        Get the module and project according to the given parameters. If a parameter is None, the default one will be
+        used. If the default one is None as well, an exception is raised.
+        """
+        # Inlined instead of using `_get()`, as this is called for practically every file operation
+        if project is None:
+            project = self.default_project
+        if module is None:
+            module = self.default_module
+        if project is None or module is None:
+            raise ValueError('no argument or default given')
+        return project, module
 
     @abstractmethod
     def open_project(self, module: str, project: str) -> None:
@@ -51,6 +78,13 @@ class AbstractFileProvider:
     def get_files(self, project: str, module: str) -> List[str]:
         """List all files belonging to a given project in the given module."""
 
+    def fetch_files(self, project: str, module: str) -> List[Tuple[str, Path]]:
+        """
+        Fetch all files belonging to a given project in the given module for read-only access, returning a list of
+        `(filename, local_path)` tuples. Providers with a remote store should override this to fetch the files in bulk.
+        """
+        return [(fn, self.get(fn, project=project, module=module)) for fn in self.get_files(project, module)]
+
     @abstractmethod
     def delete(self, fn: str, *, project: str, module: str) -> None:
         """Delete the given file."""
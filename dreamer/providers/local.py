@@ -1,17 +1,31 @@
 """The local filesystem provider for Dreamer."""
 
+import os
 import stat
 
 from pathlib import Path
 from shutil import rmtree
 from types import TracebackType
-from typing import List, Optional, Tuple, Type
+from typing import Dict, List, Optional, Tuple, Type
 
 from ..exceptions import DreamerException
 from .base import AbstractFileProvider
 from .utils import _get
 
 
+def _list_dir(path: Path, dirs_only: bool = False) -> List[str]:
+    """
+    Return the names of the entries in the given directory, or only of the subdirectories if `dirs_only` is True. A
+    missing directory has no entries. Uses `os.scandir()`, which usually knows the entry types without an extra
+    `stat()`.
+    """
+    try:
+        with os.scandir(path) as entries:
+            return [entry.name for entry in entries if not dirs_only or entry.is_dir()]
+    except FileNotFoundError:
+        return []
+
+
 class LocalFileProvider(AbstractFileProvider):
     """A file provider for storing the Dreamer state in the local filesystem."""
 
@@ -21,73 +35,66 @@ class LocalFileProvider(AbstractFileProvider):
         self.base_dir = Path(base_dir)
         self.default_module: Optional[str] = default_module
         self.default_project: Optional[str] = default_project
-
-    def _get_project_and_module(self, project: Optional[str] = None, module: Optional[str] = None) -> Tuple[str, str]:
-        """
-        Get the module and project according to the given parameters. If a parameter is None, the default one will be
-        used. If the default one is None as well, an exception is raised.
-        """
-        project = _get(project, self.default_project)
-        module = _get(module, self.default_module)
-        return project, module
+        # A cache of (module, project) -> project directory
+        self._project_dirs: Dict[Tuple[str, str], Path] = {}
+
+    def _project_dir(self, module: str, project: str) -> Path:
+        """Get the directory of the given project in the given module."""
+        path = self._project_dirs.get((module, project))
+        if path is None:
+            path = self._project_dirs[(module, project)] = self.base_dir / module / project
+        return path
 
     def get_path(self, fn: str, project: str, module: str) -> Path:
         """Get the path for the given file in the given project in the given module."""
-        return self.base_dir / module / project / fn
+        return self._project_dir(module, project) / fn
 
     def get(self, fn: str, *, project: Optional[str] = None, module: Optional[str] = None) -> Path:
         project, module = self._get_project_and_module(project, module)
+        # Not cached: the file might be deleted behind our back, and the existence check is all that `get()` costs
         path = self.get_path(fn, project, module)
-        if not path.exists():
+        if not os.path.exists(path):
             raise FileNotFoundError(path)
         return path
 
     def get_rw(self, fn: str, *, project: Optional[str] = None, module: Optional[str] = None) -> Path:
         project, module = self._get_project_and_module(project, module)
         # `get_rw()` is the only place that should ever start actually writing the state, so this is the logical place
-        # to ensure that the base directory exists.
-        if not self.base_dir.exists():
-            self.base_dir.mkdir()
-        module_dir = self.base_dir / module
-        if not module_dir.exists():
-            module_dir.mkdir()
-        project_dir = module_dir / project
-        if not project_dir.exists():
-            project_dir.mkdir()
+        # to ensure that the base, module and project directories exist.
+        self._project_dir(module, project).mkdir(parents=True, exist_ok=True)
         # Finally: `get_rw()` should transparently create an empty file if it is not present on the filesystem
         path = self.get_path(fn, project, module)
-        if not path.exists():
-            path.touch()
+        path.touch(exist_ok=True)
         return path
 
     def get_modules(self) -> List[str]:
-        return [str(node.name) for node in self.base_dir.glob('*') if node.is_dir()]
+        return _list_dir(self.base_dir, dirs_only=True)
 
     def get_projects(self, module: Optional[str] = None) -> List[str]:
         module = _get(module, self.default_module)
-        return [str(node.name) for node in (self.base_dir / module).glob('*') if node.is_dir()]
+        return _list_dir(self.base_dir / module, dirs_only=True)
 
     def get_files(self, project: Optional[str] = None, module: Optional[str] = None) -> List[str]:
         project, module = self._get_project_and_module(project, module)
-        return sorted(str(node.name) for node in (self.base_dir / module / project).glob('*'))
+        return sorted(_list_dir(self._project_dir(module, project)))
 
     def delete(self, fn: str, *, project: Optional[str] = None, module: Optional[str] = None) -> None:
         project, module = self._get_project_and_module(project, module)
-        return (self.base_dir / module / project / fn).unlink()
+        os.unlink(os.path.join(self._project_dir(module, project), fn))
 
     def delete_project(self, project: str, module: Optional[str] = None, recursive: bool = False) -> None:
         project, module = self._get_project_and_module(project, module)
         if recursive:
-            rmtree(self.base_dir / module / project)
+            rmtree(self._project_dir(module, project))
         else:
-            (self.base_dir / module / project).rmdir()
+            os.rmdir(self._project_dir(module, project))
 
     def module_exists(self, module: str) -> bool:
-        return (self.base_dir / module).is_dir()
+        return os.path.isdir(self.base_dir / module)
 
     def project_exists(self, project: str, module: Optional[str] = None) -> bool:
         module = _get(module, self.default_module)
-        return (self.base_dir / module / project).is_dir()
+        return os.path.isdir(self._project_dir(module, project))
 
     def sync(self) -> bool:
         # no-op
@@ -96,17 +103,17 @@ class LocalFileProvider(AbstractFileProvider):
     def get_default_local_path(self) -> Path:
         if self.default_module is None or self.default_project is None:
             raise DreamerException('get_default_local_path() called without default_module and default_project')
-        return self.base_dir / self.default_module / self.default_project
+        return self._project_dir(self.default_module, self.default_project)
 
     def get_base_url(self) -> str:
         return str(self.base_dir)
 
     def url_for(self, fn: str, *, project: Optional[str] = None, module: Optional[str] = None) -> str:
-        module, project = self._get_project_and_module(project, module)
-        return str(self.get_path(fn, project, module))
+        project, module = self._get_project_and_module(project, module)
+        return os.path.join(self._project_dir(module, project), fn)
 
     def url_for_project(self, project: str, module: str) -> str:
-        return str(self.base_dir / module / project)
+        return str(self._project_dir(module, project))
 
     def open_project(self, module: str, project: str) -> None:
         self.default_module = module
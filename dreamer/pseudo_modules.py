@@ -6,12 +6,16 @@ by e.g. listing them for the user.
 """
 
 import argparse
+import functools
+import json
 import os.path
+import re
 import subprocess
 import sys
 
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Any, List, Optional
+from typing import Any, Dict, List, Optional, Type
 
 from .providers.base import AbstractFileProvider
 from .runconfig import RunConfig
@@ -28,8 +32,29 @@ else:
     from importlib.metadata import version as get_version
 
 
+# The installed version does not change during the lifetime of the process, so only look it up once
+if get_version is not None:
+    get_version = functools.lru_cache(maxsize=None)(get_version)  # pylint: disable=invalid-name
+
+
+_TERRAFORM_VERSION_RE = re.compile(rb'Terraform v(\d+)\.(\d+)')
+_ANSIBLE_VERSION_RE = re.compile(rb'ansible-playbook \[?(?:core )?(\d+)\.(\d+)(?:\.(\d+))?')
+
+
+@functools.lru_cache(maxsize=None)
 def is_editable(package: str) -> bool:
     """Is the given package installed as editable, that is, with `pip install -e`?"""
+    # Modern pip records editable installs in the package metadata (PEP 610)
+    if sys.version_info >= (3, 8, 0):
+        from importlib.metadata import PackageNotFoundError, distribution  # pylint: disable=import-outside-toplevel
+        try:
+            direct_url = distribution(package).read_text('direct_url.json')
+        except PackageNotFoundError:
+            direct_url = None
+        if direct_url and json.loads(direct_url).get('dir_info', {}).get('editable', False):
+            return True
+
+    # Legacy editable installs only leave an .egg-link file behind
     for path in sys.path:
         egg_link = os.path.join(path, f'{package}.egg-link')
         if os.path.isfile(egg_link):
@@ -37,6 +62,10 @@ def is_editable(package: str) -> bool:
     return False
 
 
+PSEUDO_MODULE_REGISTRY: Dict[str, Type['PseudoModule']] = {}
+"""All direct subclasses of `PseudoModule` as <friendly name> -> <class>, registered when the subclass is defined."""
+
+
 class PseudoModule:
     """
     A base class for internal "pseudo-modules" that run tasks not directly related to building infrastructure, such as
@@ -54,12 +83,17 @@ class PseudoModule:
     `hasattr` calls and/or other trickery.
     """
 
+    def __init_subclass__(cls, **kwargs: Any) -> None:
+        """Register direct subclasses in `PSEUDO_MODULE_REGISTRY`."""
+        super().__init_subclass__(**kwargs)
+        if PseudoModule in cls.__bases__:
+            PSEUDO_MODULE_REGISTRY[cls.friendly_name] = cls
+
     def __init__(self, name: str, file_provider: AbstractFileProvider, tf_config: RunConfig, ansible_config: RunConfig,
                  additional_args: Optional[List[str]] = None) -> None:
         if self.parser and additional_args:
-            args = self.parser.parse_args(additional_args)
-            for key, value in vars(args).items():
-                setattr(self, key, value)
+            # The parsed arguments are plain instance attributes, so they can be copied over in one go
+            self.__dict__.update(vars(self.parser.parse_args(additional_args)))
         self.provider = file_provider
         self.name = name
         self.tf_config = tf_config
@@ -91,13 +125,15 @@ class ListPseudoModule(PseudoModule):
     def run(self) -> None:
         # pylint: disable=E1101
         print(f'Base directory: {self.provider.get_base_url()}')
-        modules = self.provider.get_modules()
+        # When a single module is requested, there is no need to list all modules
+        if self.module:
+            modules = [self.module] if self.provider.module_exists(self.module) else []
+        else:
+            modules = self.provider.get_modules()
         if not modules:
             print('  (no modules)')
             return
         for module in modules:
-            if self.module and module != self.module:
-                continue
             print(f'Module: {module}')
             projects = self.provider.get_projects(module)
             if not projects:
@@ -115,38 +151,50 @@ class TroubleshootModule(PseudoModule):
     friendly_name = 'troubleshoot'
 
     def run(self) -> None:
-        # Dreamer version check
-        if get_version is not None:
-            print(f'Dreamer version: {get_version("dreamer")}')
-            if is_editable('dreamer'):
-                print('Note: Dreamer seems to be installed in editable mode, above version might be incorrect!')
-                print('      Finding git commit information...')
-                base_path = Path(__file__).parent.parent
-                try:
-                    print(f'Dreamer git status: {git_version(base_path)}')
-                except subprocess.CalledProcessError:
-                    pass
-        else:
-            print('Unable to get Dreamer version; running on Python <3.8 without setuptools installed.')
-        print()
+        # The external version checks are independent, so run them in the background while checking our own version
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            tf_future = executor.submit(subprocess.run, ('terraform', 'version'), capture_output=True, check=False)
+            ansible_future = executor.submit(
+                subprocess.run, ('ansible-playbook', '--version'), capture_output=True, check=False
+            )
+
+            # Dreamer version check
+            if get_version is not None:
+                print(f'Dreamer version: {get_version("dreamer")}')
+                if is_editable('dreamer'):
+                    print('Note: Dreamer seems to be installed in editable mode, above version might be incorrect!')
+                    print('      Finding git commit information...')
+                    base_path = Path(__file__).parent.parent
+                    try:
+                        print(f'Dreamer git status: {git_version(base_path)}')
+                    except subprocess.CalledProcessError:
+                        pass
+            else:
+                print('Unable to get Dreamer version; running on Python <3.8 without setuptools installed.')
+            print()
+
+            tf_result = tf_future.result()
+            ansible_result = ansible_future.result()
 
         # Terraform version check: "Terraform v0.12.21"
-        result = subprocess.run(('terraform', 'version'), capture_output=True, check=False)
-        tf_version = result.stdout.splitlines()[0].decode()
-        major, minor = (int(x) for x in tf_version.split()[1][1:].split(".", 2)[:2])
-        if major < 1 and minor < 15:
+        tf_version = tf_result.stdout.split(b'\n', 1)[0].decode()
+        match = _TERRAFORM_VERSION_RE.search(tf_result.stdout)
+        if match is None:
+            print(f'Unable to parse the Terraform version (found: {tf_version})')
+        elif (int(match[1]), int(match[2])) < (0, 15):
             print(f'You are running an old version of Terraform, please upgrade to 1.0 or 0.15+ (found: {tf_version})')
         else:
             print(f'Terraform up to date: {tf_version}')
 
-        # Ansible version check: "ansible-playbook 2.9.6"
-        result = subprocess.run(('ansible-playbook', '--version'), capture_output=True, check=False)
-        ansible_version_raw = result.stdout.splitlines()[0].decode()
-        ansible_version = tuple(int(x) for x in ansible_version_raw.split()[1].split('.'))
-        if ansible_version < (2, 8, 0):
+        # Ansible version check: "ansible-playbook 2.9.6" or "ansible-playbook [core 2.15.3]"
+        ansible_version_raw = ansible_result.stdout.split(b'\n', 1)[0].decode()
+        match = _ANSIBLE_VERSION_RE.search(ansible_result.stdout)
+        if match is None:
+            print(f'Unable to parse the Ansible version (found: {ansible_version_raw})')
+        elif (int(match[1]), int(match[2]), int(match[3] or 0)) < (2, 8, 0):
             print(
-                'You are running an outdated version of Ansible, which is not supported by Dreamer (found: %s)',
-                ansible_version_raw
+                'You are running an outdated version of Ansible, which is not supported by Dreamer '
+                f'(found: {ansible_version_raw})'
             )
         else:
             print(f'Ansible up to date: {ansible_version_raw}')
@@ -2,30 +2,60 @@
 
 """Contains the RunConfig class and related utilities."""
 
-from typing import List, Mapping, Optional, TypeVar, Union
+import functools
+
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Sequence, Tuple, TypeVar, Union
 from .utils import quote
 
 AnyRunConfig = TypeVar('AnyRunConfig', bound='RunConfig')
 
+
+def _with_args(arguments: Tuple[str, ...], new_arguments: Iterable[str]) -> Tuple[str, ...]:
+    """Return the arguments with the new arguments appended."""
+    return (*arguments, *new_arguments)
+
+
+def _with_env(environment: Mapping[str, Any], new_environment: Mapping[str, Any]) -> Dict[str, Any]:
+    """Return a copy of the environment with the new environment variables added (or overwritten)."""
+    result = dict(environment)
+    result.update(new_environment)
+    return result
+
+
 class RunConfig:
     """
-    Contains environment variables and arguments needed to run shell commands. Environment variable values can be
-    RunConfigs on their own right, in which case only their arguments as produced by get_arguments() are used as the
-    value of the environment variable.
+    Contains environment variables and arguments needed to run commands. Each argument is a single, unquoted argv
+    element (e.g. "-state=/path with spaces/x.tfstate"), as commands are executed directly and not via a shell.
+    Environment variable values can be RunConfigs on their own right, in which case only their arguments as produced by
+    get_arguments() are used as the value of the environment variable (e.g. `ANSIBLE_SSH_ARGS`, which is split into
+    arguments by the consuming program).
     """
 
-    def __init__(self, arguments: Optional[List[str]] = None,
+    __slots__ = ('_arguments', '_environment', '_arguments_str', '_environment_str')
+
+    def __init__(self, arguments: Optional[Sequence[str]] = None,
                  environment: Optional[Mapping[str, Union[str, 'RunConfig']]] = None) -> None:
-        self._arguments = arguments or []
+        self._arguments: Tuple[str, ...] = tuple(arguments or ())
         self._environment = environment or {}
+        # The string forms are cached, as run configurations are never modified after construction
+        self._arguments_str: Optional[str] = None
+        self._environment_str: Optional[str] = None
 
     def with_arguments(self: AnyRunConfig, *arguments: str) -> AnyRunConfig:
-        """Return a RunConfig with the given arguments added."""
-        return RunConfig(self._arguments + list(arguments), self._environment)
+        """
+        Return a RunConfig with the given arguments added. Each parameter is exactly one argument and is not split or
+        unquoted, e.g. `with_arguments('-var', 'foo=bar', '-parallelism=2')`; use `shlex.split()` for shell-style
+        strings.
+        """
+        return RunConfig(_with_args(self._arguments, arguments), self._environment)
 
     def with_environment(self: AnyRunConfig, name: str, value: Union[str, 'RunConfig']) -> AnyRunConfig:
         """Return a new RunConfig with the given environment variables added."""
-        return RunConfig(self._arguments, {**self._environment, name: value})
+        return RunConfig(self._arguments, _with_env(self._environment, {name: value}))
+
+    def with_environments(self: AnyRunConfig, environment: Mapping[str, Union[str, 'RunConfig']]) -> AnyRunConfig:
+        """Return a new RunConfig with all of the given environment variables added."""
+        return RunConfig(self._arguments, _with_env(self._environment, environment))
 
     def with_child_arguments(self: AnyRunConfig, name: str, *arguments: str) -> AnyRunConfig:
         """Return a new RunConfig with the arguments of the given child RunConfig environment variable updated."""
@@ -34,25 +64,38 @@ class RunConfig:
         if not isinstance(self._environment[name], RunConfig):
             raise ValueError(f'environment variable {name} is not a RunConfig')
         new_child = self._environment[name].with_arguments(*arguments)  # type: ignore
-        return RunConfig(self._arguments, {**self._environment, name: new_child})
+        return RunConfig(self._arguments, _with_env(self._environment, {name: new_child}))
 
     def get_arguments(self) -> str:
-        """Return the arguments, joined by spaces."""
-        return ' '.join(self._arguments)
+        """Return the arguments as a single string, quoted for the shell where necessary and joined by spaces."""
+        if self._arguments_str is None:
+            self._arguments_str = ' '.join(quote(argument) for argument in self._arguments)
+        return self._arguments_str
+
+    def get_env(self) -> Dict[str, str]:
+        """Return the environment variables as a dict suitable for passing to a subprocess."""
+        return {name: _env_value(value) for name, value in self._environment.items()}
 
     def get_environment(self) -> str:
         """Return the environment variables in the form 'A="a" B="b c"'"""
-        def to_str(child: Union[str, RunConfig]) -> str:
-            if isinstance(child, RunConfig):
-                return child.get_arguments()
-            return child
-        return ' '.join(f'{name}={quote(to_str(value))}' for name, value in self._environment.items())
+        if self._environment_str is None:
+            self._environment_str = ' '.join(
+                _env_fragment(name, value) for name, value in self._environment.items()
+            )
+        return self._environment_str
+
+    def get_argv(self, command: str, *suffix: str) -> List[str]:
+        """
+        Return the argv list for running the given command with the run configuration, in the format
+        `[command, arg1, arg2, *suffix]`. The environment variables are not included; see `get_env()`.
+        """
+        return [command, *self._arguments, *suffix]
 
     def get_cmdline(self, command: str, suffix: Optional[str] = None) -> str:
         """
-        Return a full command line for running the given command with the run configuration. The given command and
-        suffix are not parsed in any way, so they can contain spaces (e.g. "terraform plan" as the command) or shell
-        redirections (e.g. "> output_file.txt" as suffix).
+        Return a full shell command line for running the given command with the run configuration. The given command
+        and suffix are not parsed in any way, so they can contain spaces (e.g. "terraform plan" as the command) or shell
+        redirections (e.g. "> output_file.txt" as suffix). The arguments and environment variables are quoted.
         The output is in the format 'A="a" B="b c" command -arg1 -arg2 suffix'
         """
         prefix = self.get_environment()
@@ -73,43 +116,71 @@ class RunConfig:
             return TypeError(f'unsupported operand types for |: RunConfig and {type(other)}')
         # pylint: disable=W0212
         return RunConfig(
-            self._arguments + other._arguments,
-            {**self._environment, **other._environment}
+            _with_args(self._arguments, other._arguments),
+            _with_env(self._environment, other._environment)
         )
         # pylint: enable=W0212
 
 
+@functools.lru_cache(maxsize=1024)
+def _quoted_env_fragment(name: str, value: str) -> str:
+    """Return the quoted `NAME=value` form of a plain string environment variable."""
+    return f'{name}={quote(value)}'
+
+
+def _env_fragment(name: str, value: Union[str, RunConfig]) -> str:
+    """
+    Return the quoted `NAME=value` form of an environment variable. Plain string values are shared by all run
+    configurations derived from each other, so their quoted forms are cached across run configurations.
+    """
+    if isinstance(value, RunConfig):
+        return f'{name}={quote(value.get_arguments())}'
+    return _quoted_env_fragment(name, value)
+
+
+def _env_value(value: Union[str, RunConfig]) -> str:
+    """Return the string value of an environment variable, which might be a RunConfig of its own."""
+    if isinstance(value, RunConfig):
+        return value.get_arguments()
+    return value
+
+
 class TerraformRunConfig:
     """
     A run configuration specific for Terraform, because Terraform >=0.15 requires very precise argument placement,
     to the absolute joy of automation developers across the world.
 
     The command line formed by this runconfiguration is in the following form:
-    `[environment] <command> [global_arguments] <subcommand> [arguments] [suffix]`
-    where `<command>` is probably usually `terraform`.
+    `<command> [global_arguments] <subcommand> [arguments] [suffix]`
+    where `<command>` is probably usually `terraform`. As with RunConfig, each argument is a single argv element.
     """
 
+    __slots__ = ('_global_arguments', '_arguments', '_environment', '_arguments_str', '_environment_str')
+
     def __init__(self,
-                 global_arguments: Optional[List[str]] = None,
-                 arguments: Optional[List[str]] = None,
+                 global_arguments: Optional[Sequence[str]] = None,
+                 arguments: Optional[Sequence[str]] = None,
                  environment: Optional[Mapping[str, Union[str, AnyRunConfig]]] = None) -> None:
-        self._global_arguments = global_arguments or []
-        self._arguments = arguments or []
+        self._global_arguments: Tuple[str, ...] = tuple(global_arguments or ())
+        self._arguments: Tuple[str, ...] = tuple(arguments or ())
         self._environment = environment or {}
+        # The string forms are cached, as run configurations are never modified after construction
+        self._arguments_str: Optional[str] = None
+        self._environment_str: Optional[str] = None
 
     def with_global_arguments(self, *arguments: str) -> 'TerraformRunConfig':
-        """Return a TerraformRunConfig with the given global arguments added."""
+        """Return a TerraformRunConfig with the given global arguments added, one argument per parameter."""
         return TerraformRunConfig(
-            self._global_arguments + list(arguments),
+            _with_args(self._global_arguments, arguments),
             self._arguments,
             self._environment
         )
 
     def with_arguments(self, *arguments: str) -> 'TerraformRunConfig':
-        """Return a RunConfig with the given arguments added."""
+        """Return a RunConfig with the given arguments added, one argument per parameter (see `RunConfig`)."""
         return TerraformRunConfig(
             self._global_arguments,
-            self._arguments + list(arguments),
+            _with_args(self._arguments, arguments),
             self._environment
         )
 
@@ -118,7 +189,15 @@ class TerraformRunConfig:
         return TerraformRunConfig(
             self._global_arguments,
             self._arguments,
-            {**self._environment, name: value}
+            _with_env(self._environment, {name: value})
+        )
+
+    def with_environments(self, environment: Mapping[str, Union[str, AnyRunConfig]]) -> 'TerraformRunConfig':
+        """Return a new TerraformRunConfig with all of the given environment variables added."""
+        return TerraformRunConfig(
+            self._global_arguments,
+            self._arguments,
+            _with_env(self._environment, environment)
         )
 
     def with_child_arguments(self, name: str, *arguments: str) -> 'TerraformRunConfig':
@@ -128,29 +207,47 @@ class TerraformRunConfig:
         if not isinstance(self._environment[name], RunConfig):
             raise ValueError(f'environment variable {name} is not a RunConfig')
         new_child = self._environment[name].with_arguments(*arguments)  # type: ignore
-        return TerraformRunConfig(self._arguments, {**self._environment, name: new_child})
+        return TerraformRunConfig(
+            self._global_arguments,
+            self._arguments,
+            _with_env(self._environment, {name: new_child})
+        )
 
     def get_global_arguments(self) -> str:
-        """Return the global arguments, joined by spaces."""
-        return ' '.join(self._global_arguments)
+        """Return the global arguments as a single string, quoted for the shell where necessary and joined by spaces."""
+        return ' '.join(quote(argument) for argument in self._global_arguments)
 
     def get_arguments(self) -> str:
-        """Return the arguments, joined by spaces."""
-        return ' '.join(self._arguments)
+        """Return the arguments as a single string, quoted for the shell where necessary and joined by spaces."""
+        if self._arguments_str is None:
+            self._arguments_str = ' '.join(quote(argument) for argument in self._arguments)
+        return self._arguments_str
+
+    def get_env(self) -> Dict[str, str]:
+        """Return the environment variables as a dict suitable for passing to a subprocess."""
+        return {name: _env_value(value) for name, value in self._environment.items()}
 
     def get_environment(self) -> str:
         """Return the environment variables in the form 'A="a" B="b c"'"""
-        def to_str(child: Union[str, AnyRunConfig]) -> str:
-            if isinstance(child, RunConfig):
-                return child.get_arguments()
-            return child
-        return ' '.join(f'{name}={quote(to_str(value))}' for name, value in self._environment.items())
+        if self._environment_str is None:
+            self._environment_str = ' '.join(
+                _env_fragment(name, value) for name, value in self._environment.items()
+            )
+        return self._environment_str
+
+    def get_argv(self, command: str, tf_command: str, *suffix: str) -> List[str]:
+        """
+        Return the argv list for running the given command with the run configuration, in the format
+        `[command, *global_arguments, tf_command, *arguments, *suffix]`, where `command` is probably usually
+        `terraform`. The environment variables are not included; see `get_env()`.
+        """
+        return [command, *self._global_arguments, tf_command, *self._arguments, *suffix]
 
     def get_cmdline(self, command: str, tf_command: str, suffix: Optional[str] = None) -> str:
         """
-        Return a full command line for running the given command with the run configuration. The given command and
-        suffix are not parsed in any way, so they can contain spaces (e.g. "terraform plan" as the command) or shell
-        redirections (e.g. "> output_file.txt" as suffix).
+        Return a full shell command line for running the given command with the run configuration. The given command
+        and suffix are not parsed in any way, so they can contain spaces (e.g. "terraform plan" as the command) or shell
+        redirections (e.g. "> output_file.txt" as suffix). The arguments and environment variables are quoted.
         The output is in the format 'A="a" B="b c" command -arg1 -arg2 suffix'
         """
         prefix = self.get_environment()
@@ -171,12 +268,12 @@ class TerraformRunConfig:
             return TypeError(f'unsupported operand types for |: RunConfig and {type(other)}')
         if isinstance(other, TerraformRunConfig):
             return TerraformRunConfig(
-                self._global_arguments + other._global_arguments,
-                self._arguments + other._arguments,
-                {**self._environment, **other._environment}
+                _with_args(self._global_arguments, other._global_arguments),
+                _with_args(self._arguments, other._arguments),
+                _with_env(self._environment, other._environment)
             )
         return TerraformRunConfig(
             self._global_arguments,
-            self._arguments + other._arguments,
-            {**self._environment, **other._environment}
+            _with_args(self._arguments, other._arguments),
+            _with_env(self._environment, other._environment)
         )
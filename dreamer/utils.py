@@ -2,17 +2,29 @@
 
 """Small helper functions and constants for Dreamer."""
 
-import difflib
+import contextlib
+import functools
+import hashlib
+import json
 import logging
 import os
 import pathlib
 import shlex
 import shutil
+import socket
+import struct
 import subprocess
 import sys
 import tempfile
 
-from typing import Callable, Optional, TextIO, Tuple, Union
+from typing import (Any, BinaryIO, Callable, Dict, Iterator, List, Mapping, NamedTuple, Optional, Sequence, TextIO,
+                    Tuple, Union)
+
+# `orjson` is an optional dependency for faster parsing of (potentially large) Terraform JSON output
+try:
+    import orjson
+except ImportError:
+    orjson = None  # type: ignore  # pylint: disable=invalid-name
 
 # Helpers for command-line
 RED = '\033[91m'
@@ -22,35 +34,92 @@ MAGENTA = '\033[95m'
 WHITE = '\033[97m'
 RESET = '\033[0m'
 
+# SSH agent protocol message numbers, see draft-miller-ssh-agent
+SSH_AGENTC_REQUEST_IDENTITIES = 11
+SSH_AGENT_IDENTITIES_ANSWER = 12
+
+
+LEVEL_COLORS = {
+    logging.CRITICAL: MAGENTA,
+    logging.ERROR: RED,
+    logging.WARNING: YELLOW,
+    logging.INFO: GREEN,
+    logging.DEBUG: WHITE,
+}
+"""The color of log messages by level, see `ColorFormatter`."""
+
 
 class ColorFormatter(logging.Formatter):
     """
     A simple log formatter that colors output lines depending on their level.
     """
+    def __init__(self, fmt: Optional[str] = None, datefmt: Optional[str] = None, style: str = '%',
+                 **kwargs: Any) -> None:
+        super().__init__(fmt, datefmt, style, **kwargs)  # type: ignore
+        self._style_char = style
+        self._kwargs = kwargs
+        # A (color, formatter) pair per level, where the formatter has the color baked into its format string so that
+        # records are formatted in a single pass
+        self._formatters: Dict[int, Tuple[str, logging.Formatter]] = {}
+
+    def _get_formatter(self, levelno: int) -> Tuple[str, logging.Formatter]:
+        """Return the color and the colored formatter for the given level, creating them on first use."""
+        entry = self._formatters.get(levelno)
+        if entry is None:
+            color = LEVEL_COLORS.get(levelno)
+            if color is None:
+                # Custom levels get the color of the closest standard level below them
+                color = next((clr for level, clr in LEVEL_COLORS.items() if levelno >= level), WHITE)
+            fmt = f'{color}{self._style._fmt}{RESET}'  # pylint: disable=protected-access
+            entry = self._formatters[levelno] = (
+                color, logging.Formatter(fmt, self.datefmt, self._style_char, **self._kwargs)  # type: ignore
+            )
+        return entry
+
     def format(self, record: logging.LogRecord) -> str:
-        if record.levelno >= logging.CRITICAL:
-            color = MAGENTA
-        elif record.levelno >= logging.ERROR:
-            color = RED
-        elif record.levelno >= logging.WARNING:
-            color = YELLOW
-        elif record.levelno >= logging.INFO:
-            color = GREEN
-        else:
-            color = WHITE
-        msg = super().format(record)
-        return f'{color}{msg}{RESET}'
+        color, formatter = self._get_formatter(record.levelno)
+        if record.exc_info or record.exc_text or record.stack_info:
+            # Tracebacks are appended after the formatted message, so color the whole output instead
+            return f'{color}{super().format(record)}{RESET}'
+        return formatter.format(record)
 
 
 def git_branch() -> Optional[str]:
-    """Return current git branch name or None if not in a git repository"""
-    try:
-        return subprocess.check_output(
-            ['git', 'rev-parse', '--abbrev-ref', 'HEAD'],
-            stderr=subprocess.DEVNULL,
-        ).strip(b'\n').decode('utf-8')
-    except subprocess.CalledProcessError:
-        return None
+    """
+    Return current git branch name or None if not in a git repository. Reads `.git/HEAD` directly instead of running
+    git; like `git rev-parse --abbrev-ref HEAD`, returns "HEAD" for a detached HEAD.
+    """
+    cwd = pathlib.Path.cwd()
+    for directory in (cwd, *cwd.parents):
+        git_path = directory / '.git'
+        try:
+            if git_path.is_file():
+                # Worktrees and submodules have a `.git` file pointing at the actual git directory
+                gitdir = git_path.read_text().strip()
+                if not gitdir.startswith('gitdir: '):
+                    return None
+                git_path = directory / gitdir[len('gitdir: '):]
+            head = (git_path / 'HEAD').read_text().strip()
+        except FileNotFoundError:
+            continue
+        except OSError:
+            return None
+        if head.startswith('ref: refs/heads/'):
+            return head[len('ref: refs/heads/'):]
+        return 'HEAD'
+    return None
+
+
+def _parse_describe(output: str) -> Tuple[Optional[str], str]:
+    """
+    Split the output of `git describe --tags --long --always` into the tag (None unless HEAD is exactly at the tag)
+    and the abbreviated commit name.
+    """
+    parts = output.rsplit('-', 2)
+    if len(parts) == 3 and parts[1].isdigit() and parts[2].startswith('g'):
+        tag, distance, abbrev = parts
+        return (tag if distance == '0' else None), abbrev[1:]
+    return None, output
 
 
 def git_version(path: pathlib.Path) -> str:
@@ -63,54 +132,40 @@ def git_version(path: pathlib.Path) -> str:
     * If the repository is in a non-pristine state, "-dirty" is appended to the base
     * If none of this information could be found, "unknown" is returned
     """
-
-    with subprocess.Popen(
-            ['git', 'describe', '--tags', '--exact-match'],
-            stdout=subprocess.PIPE,
-            stderr=subprocess.DEVNULL,
-            universal_newlines=True,
-            cwd=path) as child:
-        return_code = child.wait()
-        if return_code != 0 or child.stdout is None:
-            tag = None
-        else:
-            tag = child.stdout.read()[:-1]  # strip trailing newline
-
-    with subprocess.Popen(
-            ['git', 'symbolic-ref', '-q', '--short', 'HEAD'],
-            stdout=subprocess.PIPE,
-            stderr=subprocess.DEVNULL,
-            universal_newlines=True,
-            cwd=path) as child:
-        return_code = child.wait()
-        if return_code != 0 or child.stdout is None:
-            branch = None
-        else:
-            branch = child.stdout.read()[:-1]
-
-    with subprocess.Popen(
-            ['git', 'rev-parse', '--short', 'HEAD'],
-            stdout=subprocess.PIPE,
-            stderr=subprocess.DEVNULL,
-            universal_newlines=True,
-            cwd=path) as child:
-        return_code = child.wait()
-        if return_code != 0 or child.stdout is None:
-            commit = None
-        else:
-            commit = child.stdout.read()[:-1]
-
-    with subprocess.Popen(
-            ['git', 'status', '--porcelain'],
-            stdout=subprocess.PIPE,
-            stderr=subprocess.DEVNULL,
-            universal_newlines=True,
-            cwd=path) as child:
-        return_code = child.wait()
-        if return_code != 0 or child.stdout is None:
-            is_dirty = False  # if `git status` errors, it's possible this isn't a git repository at all
-        else:
-            is_dirty = len(child.stdout.read().strip()) > 0
+    # Both commands are run in binary mode: only a few short header lines need decoding, the file list of a dirty
+    # working tree does not.
+    # With `--long`, `git describe` prints `<tag>-<distance>-g<abbrev>` (the distance being 0 for an exact tag match),
+    # or just `<abbrev>` if there are no tags at all. Either way git picks an abbrev that is unique in the repository.
+    describe = subprocess.run(
+        ['git', 'describe', '--tags', '--long', '--always'],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL,
+        cwd=path,
+        check=False)
+    tag: Optional[str] = None
+    commit: Optional[str] = None
+    if describe.returncode == 0:
+        tag, commit = _parse_describe(describe.stdout.rstrip(b'\n').decode(errors='replace'))
+
+    # The branch and the working tree state are both available from a single `git status` call
+    status = subprocess.run(
+        ['git', '--no-optional-locks', 'status', '--porcelain=v2', '--branch'],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL,
+        cwd=path,
+        check=False)
+    branch = None
+    is_dirty = False  # if `git status` errors, it's possible this isn't a git repository at all
+    if status.returncode == 0:
+        for line in status.stdout.splitlines():
+            if line.startswith(b'# branch.head '):
+                head = line[len(b'# branch.head '):]
+                if head != b'(detached)':
+                    branch = head.decode(errors='replace')
+            elif not line.startswith(b'#'):
+                # The headers come first, so the first file entry is all that is needed
+                is_dirty = True
+                break
 
     version = "unknown"
     if tag is not None:
@@ -126,10 +181,66 @@ def git_version(path: pathlib.Path) -> str:
 
     return version
 
+
+def get_cache_dir() -> pathlib.Path:
+    """Return the Dreamer cache directory, `$XDG_CACHE_HOME/dreamer` (by default `~/.cache/dreamer`)."""
+    cache_home = os.environ.get('XDG_CACHE_HOME') or os.path.expanduser('~/.cache')
+    return pathlib.Path(cache_home) / 'dreamer'
+
+
+def load_json(data: Union[bytes, str]) -> Any:
+    """Parse the given JSON document, using `orjson` if it is installed and the standard library otherwise."""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def _recv_exact(sock: socket.socket, size: int) -> bytes:
+    """Read exactly `size` bytes from the socket, raising ValueError if the peer closes the connection early."""
+    data = b''
+    while len(data) < size:
+        chunk = sock.recv(size - len(data))
+        if not chunk:
+            raise ValueError('SSH agent closed the connection unexpectedly')
+        data += chunk
+    return data
+
+
+def ssh_agent_identity_count(socket_path: str) -> int:
+    """
+    Return the number of identities loaded to the SSH agent listening on the given Unix socket. Talks the agent
+    protocol directly instead of running `ssh-add -L`. Raises OSError or ValueError if the agent could not be queried.
+    """
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(5)
+        sock.connect(socket_path)
+        sock.sendall(struct.pack('>IB', 1, SSH_AGENTC_REQUEST_IDENTITIES))
+        # The reply starts with uint32 length and byte message type. Only an identities answer is followed by the
+        # uint32 identity count (and the keys themselves); a failure reply is just those five bytes
+        _length, message_type = struct.unpack('>IB', _recv_exact(sock, 5))
+        if message_type != SSH_AGENT_IDENTITIES_ANSWER:
+            raise ValueError(f'unexpected SSH agent reply type {message_type}')
+        count, = struct.unpack('>I', _recv_exact(sock, 4))
+    return count
+
+
+def dump_json(value: Any) -> str:
+    """Serialize the given value as indented JSON, using `orjson` if it is installed."""
+    if orjson is not None:
+        return orjson.dumps(value, option=orjson.OPT_INDENT_2).decode()
+    return json.dumps(value, indent=2)
+
+
+@functools.lru_cache(maxsize=256)
+def _quote_str(value: str) -> str:
+    """Cached `shlex.quote()`; command lines are built from the same few paths and arguments over and over."""
+    return shlex.quote(value)
+
+
 def quote(path: Union[str, pathlib.Path]) -> str:
     """Return the path quoted for safe shell usage."""
     # shlex.quote() does not accept path-like objects. :(
-    return shlex.quote(str(path))
+    return _quote_str(path if isinstance(path, str) else str(path))
 
 
 def fail(msg: str) -> None:
@@ -138,17 +249,31 @@ def fail(msg: str) -> None:
     sys.exit(1)
 
 
-def run(cmd: str) -> None:
+def run(cmd: Union[str, Sequence[str]], env: Optional[Mapping[str, str]] = None) -> None:
     """
     Run the given command, displaying it beforehand, and on a non-zero subprocess exit code, terminate the main process.
+    The command should be an argv list, which is executed directly; a string is passed to the shell for compatibility
+    with module code relying on shell features such as pipes, redirection or variable expansion.
+    `env` contains the environment variables to set in addition to the inherited environment.
     """
     logger = logging.getLogger('dreamer.run')
-    logger.info('Executing: %s', cmd)
-    retval = subprocess.run(cmd, stdin=sys.stdin, stdout=sys.stdout, stderr=sys.stderr, shell=True, check=True)
+    display = cmd if isinstance(cmd, str) else ' '.join(quote(arg) for arg in cmd)
+    if env:
+        display = ' '.join(f'{name}={quote(value)}' for name, value in env.items()) + f' {display}'
+    logger.info('Executing: %s', display)
+    retval = subprocess.run(
+        cmd,
+        stdin=sys.stdin,
+        stdout=sys.stdout,
+        stderr=sys.stderr,
+        shell=isinstance(cmd, str),
+        check=True,
+        env={**os.environ, **env} if env else None,
+    )
     if retval.returncode == 0:
-        logger.info('OK: %s', cmd)
+        logger.info('OK: %s', display)
     else:
-        logger.critical('Failed: %s', cmd)
+        logger.critical('Failed: %s', display)
         sys.exit(1)
 
 
@@ -169,30 +294,31 @@ def merge_ssh_configs(source_path: pathlib.Path, destination_path: pathlib.Path,
     destination path will **not** be added during the merge.
     """
     def fn_append(_from: pathlib.Path, _to: pathlib.Path) -> None:
-        with open(_to, 'a') as dst:
-            with open(_from, 'r') as src:
-                for lines in src.readlines():
-                    dst.write(lines)
+        with open(_to, 'ab') as dst:
+            with open(_from, 'rb') as src:
+                shutil.copyfileobj(src, dst)
 
     def fn_prepend(_from: pathlib.Path, _to: pathlib.Path) -> None:
-        with open(_to, 'r+') as dst:
-            with open(_from, 'r') as src:
-                dst_contents = dst.readlines()
-                dst.seek(0)
-                for lines in src.readlines() + dst_contents:
-                    dst.write(lines)
+        # Write the merged content next to the (resolved) destination and rename it over the destination, like
+        # `atomic_write()`, instead of reading the destination into memory and rewriting it in place
+        target = pathlib.Path(os.path.realpath(_to))
+        with _replace_atomically(target) as dst:
+            for part in (_from, target):
+                with open(part, 'rb') as src:
+                    shutil.copyfileobj(src, dst)
 
     print(f"{GREEN}Merging SSH configurations: {source_path} -> {destination_path}{RESET}")
     expanded_dest = pathlib.Path(os.path.expanduser(destination_path))
     expanded_src = pathlib.Path(os.path.expanduser(source_path))
     with tempfile.NamedTemporaryFile(mode="w") as tmp:
         print(f"{GREEN}Created temporary file: {tmp.name}{RESET}")
+        skip = {f"Include {expanded_dest}\n", f"Include {destination_path}\n"}
         with open(expanded_src, "r") as src:
-            lines = [_ for _ in src if _ not in (f"Include {expanded_dest}\n", f"Include {destination_path}\n")]
-            tmp.writelines(lines)
+            tmp.writelines(line for line in src if line not in skip)
 
+        # Only this process reads the temporary file back before it is deleted, so it is enough to flush Python's
+        # buffer; it does not need to reach the disk
         tmp.flush()
-        os.fsync(tmp.fileno())
         if append:
             merge_files(pathlib.Path(tmp.name), expanded_dest, fn_append)
         else:
@@ -209,80 +335,192 @@ def merge_files(source_path: pathlib.Path, destination_path: pathlib.Path,
     3) If some source file lines exist in destination file, source file is
        merged to destination file, but the user is prompted to manually
        check the results.
+    4) If destination file already contains the source file lines as a
+       single block, nothing is merged, but the user is prompted to
+       manually check the results.
 
     Merging is done using the function defined in the fn argument. It should not return anything.
     """
-    src_len, _, matching_lines = compare(source_path, destination_path)
+    # Re-running a deployment usually leaves the destination as an exact copy of the source, which is cheap to detect
+    if (source_path.exists() and destination_path.exists()
+            and source_path.stat().st_size == destination_path.stat().st_size
+            and file_digest(source_path) == file_digest(destination_path)):
+        print((f"{YELLOW}File {destination_path} already contains {source_path}. "
+               f"Please verify {destination_path} manually!{RESET}"))
+        return
+
+    comparison = compare(source_path, destination_path)
 
-    if matching_lines == -1:
+    if not comparison.both_exist:
         shutil.copy(source_path, destination_path)
         print(f"{GREEN}Copied: {source_path} -> {destination_path}{RESET}")
-    elif matching_lines == 0:
+    elif comparison.matching_lines == 0:
         fn(source_path, destination_path)
         print(f"{GREEN}Merged: {source_path} to {destination_path}{RESET}")
-    elif matching_lines != src_len:
+    elif not comparison.contains_all:
         fn(source_path, destination_path)
         print((f"{YELLOW}Merged: {source_path} to {destination_path}. "
                f"Please verify {destination_path} manually!{RESET}"))
-    elif matching_lines == src_len:
+    else:
         print((f"{YELLOW}File {destination_path} already contains {source_path}. "
                f"Please verify {destination_path} manually!{RESET}"))
-    else:
-        print(f"{RED}Matching lines: {matching_lines} not expected! STOP{RESET}")
 
 
-def compare(this: pathlib.Path, that: pathlib.Path) -> Tuple[int, int, int]:
-    """Compare two files and return (this_length, that_length, matching_lines)."""
-    this_length = 0
-    that_length = 0
-    matching_lines = -1
+def file_digest(path: pathlib.Path, chunk_size: int = 1024 * 1024) -> bytes:
+    """Return the BLAKE2b digest of the given file, reading it in chunks of the given size to bound memory usage."""
+    hasher = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as handle:
+        for chunk in iter(lambda: handle.read(chunk_size), b''):
+            hasher.update(chunk)
+    return hasher.digest()
 
-    both_exist = this.exists() and that.exists()
 
-    if this.exists():
-        with open(this, 'r') as this_fp:
-            this_lines = this_fp.readlines()
-            this_length = len(this_lines)
+class Comparison(NamedTuple):
+    """The result of `compare()`."""
+    this_length: int
+    """The number of lines in this file, 0 if it does not exist."""
+    that_length: int
+    """The number of lines in that file, 0 if it does not exist."""
+    matching_lines: int
+    """
+    The number of non-blank lines in this file that also appear somewhere in that file, or -1 if either file does not
+    exist.
+    """
+    contains_all: bool
+    """Does that file contain the non-blank lines of this file as a single block, in the same order?"""
 
-    if that.exists():
-        with open(that, 'r') as that_fp:
-            that_lines = that_fp.readlines()
-            that_length = len(that_lines)
+    @property
+    def both_exist(self) -> bool:
+        """Do both of the compared files exist?"""
+        return self.matching_lines != -1
 
-    if both_exist:
-        matcher = difflib.SequenceMatcher()
-        matcher.set_seqs(this_lines, that_lines)
-        matching_lines = sum((_.size for _ in matcher.get_matching_blocks()))
 
-    return this_length, that_length, matching_lines
+def _content_lines(data: bytes) -> List[bytes]:
+    """Return the non-blank lines of the given data, without surrounding whitespace."""
+    return [stripped for stripped in (line.strip() for line in data.splitlines()) if stripped]
 
 
-def replace_block(handle: TextIO, name: str, data: str) -> None:
+def compare(this: pathlib.Path, that: pathlib.Path) -> Comparison:
     """
-    Add of replace a block of content in the given I/O handle. Blocks are delimited with lines in the form
-    "# start: blockname" and "# end: blockname".
-    The file is always written with Unix newlines, but is read with universal newlines.
-    The current stream position of the file handle will not be preserved.
+    Compare two files by the lines they have in common, see `Comparison`. Blank lines and surrounding whitespace are
+    ignored.
+    """
+    this_data = this.read_bytes() if this.exists() else None
+    that_data = that.read_bytes() if that.exists() else None
+    this_length = len(this_data.splitlines()) if this_data is not None else 0
+    that_length = len(that_data.splitlines()) if that_data is not None else 0
+
+    if this_data is None or that_data is None:
+        return Comparison(this_length, that_length, -1, False)
+
+    this_lines = _content_lines(this_data)
+    # Identical files match completely, no need to look at the other file's lines
+    if that_data == this_data:
+        return Comparison(this_length, that_length, len(this_lines), True)
+    that_lines = _content_lines(that_data)
+
+    # Lines that appear anywhere in that file, e.g. a shared "User" line in a different Host block, only count towards
+    # a partial match; a set membership test is enough for that, a full diff would be quadratic in the worst case
+    that_set = set(that_lines)
+    matching_lines = sum(1 for line in this_lines if line in that_set)
+
+    # Only a contiguous run of the same lines means that the block of this file is already present in that file. The
+    # stripped lines contain no newlines, so joining them turns this into a substring search on line boundaries.
+    this_block = b'\n' + b'\n'.join(this_lines) + b'\n'
+    contains_all = not this_lines or this_block in b'\n' + b'\n'.join(that_lines) + b'\n'
+
+    return Comparison(this_length, that_length, matching_lines, contains_all)
+
+
+def _find_line(content: str, line: str, start: int = 0) -> int:
+    """
+    Return the index at which the first line of the content (at or after `start`) that consists of the given text,
+    ignoring surrounding whitespace, begins; or -1 if there is no such line.
     """
+    idx = content.find(line, start)
+    while idx != -1:
+        line_start = content.rfind('\n', 0, idx) + 1
+        line_end = content.find('\n', idx)
+        if content[line_start:line_end if line_end != -1 else len(content)].strip() == line:
+            return line_start
+        idx = content.find(line, idx + len(line))
+    return -1
 
-    # If reading all lines into memory somehow becomes a performance issue in the future, this method should obviously
-    # be revamped to iterate the file instead.
+
+def replace_block_text(content: str, name: str, data: str) -> str:
+    """
+    Return the given content with a block of content added or replaced. Blocks are delimited with lines in the form
+    "# start: blockname" and "# end: blockname". The result always uses Unix newlines; everything outside the block is
+    kept as is.
+    """
     start_line = f'# start: {name}'
-    new_content = data.splitlines()
+    new_content = ''.join(f'{line}\n' for line in data.splitlines())
     end_line = f'# end: {name}'
 
-    handle.seek(0)
-    content = [line.strip() for line in handle.readlines()]
+    content = content.replace('\r\n', '\n')
+    start_idx = _find_line(content, start_line)
+
+    if start_idx == -1:
+        if content and not content.endswith('\n'):
+            content += '\n'
+        return f'{content}{start_line}\n{new_content}{end_line}'
+
+    # The block content begins on the line after the start marker
+    content_idx = content.find('\n', start_idx)
+    end_idx = _find_line(content, end_line, content_idx) if content_idx != -1 else -1
+    if end_idx == -1:
+        raise ValueError(f'block {name!r} has no end line')
+    return content[:content_idx + 1] + new_content + content[end_idx:]
 
-    if start_line not in content:
-        content.append(start_line)
-        content += new_content
-        content.append(end_line)
-    else:
-        start_idx = content.index(start_line)
-        end_idx = content.index(end_line)
-        content = content[:start_idx + 1] + new_content + content[end_idx:]
 
+def replace_block(handle: TextIO, name: str, data: str) -> None:
+    """
+    Add of replace a block of content in the given I/O handle, see `replace_block_text()`.
+    The file is always written with Unix newlines, but is read with universal newlines.
+    The current stream position of the file handle will not be preserved.
+    """
+    handle.seek(0)
+    content = replace_block_text(handle.read(), name, data)
     handle.seek(0)
     handle.truncate()
-    handle.write('\n'.join(content))
+    handle.write(content)
+
+
+@functools.lru_cache(maxsize=None)
+def _new_file_mode() -> int:
+    """Return the permissions `open()` would give a new file under the current umask."""
+    # The umask can only be read by setting it, so set it straight back
+    umask = os.umask(0o022)
+    os.umask(umask)
+    return 0o666 & ~umask
+
+
+@contextlib.contextmanager
+def _replace_atomically(path: pathlib.Path) -> Iterator[BinaryIO]:
+    """
+    Open a uniquely named temporary file next to the given path for binary writing, and rename it over the path once
+    the block completes. The file keeps the permissions of the file it replaces (or gets the usual ones for a new file),
+    and the temporary file is removed if the block fails.
+    """
+    fd, tmp_name = tempfile.mkstemp(dir=path.parent, prefix=f'.{path.name}.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as tmp:
+            yield tmp
+        try:
+            shutil.copymode(path, tmp_name)
+        except FileNotFoundError:
+            os.chmod(tmp_name, _new_file_mode())
+        os.replace(tmp_name, path)
+    except BaseException:
+        with contextlib.suppress(FileNotFoundError):
+            os.unlink(tmp_name)
+        raise
+
+
+def atomic_write(path: pathlib.Path, data: str) -> None:
+    """
+    Write the given text to the given file atomically (with Unix newlines), by first writing it to a temporary file
+    next to the target and then renaming it over the target. Readers never see a partially written file.
+    """
+    with _replace_atomically(path) as tmp:
+        tmp.write(data.encode())
@@ -12,7 +12,7 @@ setuptools.setup(
     long_description=long_description,
     long_description_type='text/markdown',
     url='https://github.com/WithSecureLabs/dreamer',
-    packages=setuptools.find_packages(),
+    packages=setuptools.find_packages(exclude=['tests', 'tests.*']),
     entry_points={
         'console_scripts': [
             'dream=dreamer.cli:main'
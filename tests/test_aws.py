@@ -0,0 +1,203 @@
+"""Tests for the local state handling of `dreamer.providers.aws`, with a fake S3 client instead of boto3."""
+
+import os
+import pathlib
+import shutil
+import tempfile
+import unittest
+from typing import Any, Dict, Optional
+
+from dreamer.exceptions import DreamerException
+from dreamer.providers.aws import AWSFileProvider, _BucketIndex
+
+
+class FakeClientError(Exception):
+    """Stands in for `botocore.exceptions.ClientError`."""
+
+    def __init__(self, code: str) -> None:
+        super().__init__(code)
+        self.response = {'Error': {'Code': code}}
+
+
+class FakeBucket:
+    """A fake S3 client, storing the objects of a single bucket as `{key: (etag, data)}`."""
+
+    def __init__(self) -> None:
+        self.objects: Dict[str, Any] = {}
+        self.downloads = 0
+        self.error: Optional[str] = None
+
+    def put(self, key: str, data: bytes, etag: str) -> None:
+        """Add an object to the bucket."""
+        self.objects[key] = (etag, data)
+
+    def _find(self, key: str) -> Any:
+        if self.error is not None:
+            raise FakeClientError(self.error)
+        if key not in self.objects:
+            raise FakeClientError('404')
+        return self.objects[key]
+
+    def head_object(self, Bucket: str, Key: str) -> Dict[str, Any]:  # pylint: disable=invalid-name
+        """Return the ETag of an object."""
+        del Bucket
+        return {'ETag': self._find(Key)[0]}
+
+    def download_file(self, bucket: str, key: str, filename: str, Config: Any = None) -> None:  # pylint: disable=invalid-name
+        """Write the contents of an object to the given file."""
+        del bucket, Config
+        data = self._find(key)[1]
+        self.downloads += 1
+        pathlib.Path(filename).write_bytes(data)
+
+
+class AWSFileProviderTestCase(unittest.TestCase):
+    """Base class creating providers that talk to a `FakeBucket`."""
+
+    def setUp(self) -> None:
+        self._tmp = tempfile.TemporaryDirectory()  # pylint: disable=consider-using-with
+        self.addCleanup(self._tmp.cleanup)
+        self.cache_dir = pathlib.Path(self._tmp.name)
+        self.bucket = FakeBucket()
+
+    def open_provider(self, cached: bool = True) -> AWSFileProvider:
+        """Return a provider for `s3://bucket/prefix` with the module `mod` and project `proj` as defaults."""
+        provider = AWSFileProvider('s3://bucket/prefix', 'mod', 'proj', self.cache_dir if cached else None)
+        # pylint: disable=protected-access
+        provider._s3._client = self.bucket
+        provider._s3.ClientError = FakeClientError
+        if provider._etags is None:
+            self.addCleanup(shutil.rmtree, provider.local_dir, True)
+        return provider
+
+    def get(self, fn: str) -> pathlib.Path:
+        """Get the given file in a provider of its own, like a separate Dreamer run would."""
+        provider = self.open_provider()
+        try:
+            return provider.get(fn)
+        finally:
+            provider._etags.close()  # type: ignore  # pylint: disable=protected-access
+
+
+class EtagCacheTest(AWSFileProviderTestCase):
+    """Tests for the persistent local cache."""
+
+    def test_unchanged_file_is_not_downloaded_again(self) -> None:
+        self.bucket.put('prefix/mod/proj/a.tfvars', b'a = 1\n', '"1"')
+        path = self.get('a.tfvars')
+        self.assertEqual(path.read_bytes(), b'a = 1\n')
+        self.get('a.tfvars')
+        self.assertEqual(self.bucket.downloads, 1)
+
+    def test_changed_file_is_downloaded_again(self) -> None:
+        self.bucket.put('prefix/mod/proj/a.tfvars', b'a = 1\n', '"1"')
+        self.get('a.tfvars')
+        self.bucket.put('prefix/mod/proj/a.tfvars', b'a = 2\n', '"2"')
+        path = self.get('a.tfvars')
+        self.assertEqual(path.read_bytes(), b'a = 2\n')
+        self.assertEqual(self.bucket.downloads, 2)
+
+    def test_locally_modified_file_is_downloaded_again(self) -> None:
+        self.bucket.put('prefix/mod/proj/a.tfvars', b'a = 1\n', '"1"')
+        path = self.get('a.tfvars')
+        path.write_bytes(b'garbage')
+        mtime = path.stat().st_mtime_ns + 1_000_000_000
+        os.utime(path, ns=(mtime, mtime))
+        self.assertEqual(self.get('a.tfvars').read_bytes(), b'a = 1\n')
+        self.assertEqual(self.bucket.downloads, 2)
+
+    def test_removed_file_is_forgotten(self) -> None:
+        self.bucket.put('prefix/mod/proj/a.tfvars', b'a = 1\n', '"1"')
+        path = self.get('a.tfvars')
+        del self.bucket.objects['prefix/mod/proj/a.tfvars']
+        with self.assertRaises(FileNotFoundError):
+            self.get('a.tfvars')
+        self.assertFalse(path.exists())
+        self.assertFalse(path.with_name('a.tfvars.etag').exists())
+
+    def test_other_errors_are_not_missing_files(self) -> None:
+        self.bucket.put('prefix/mod/proj/a.tfvars', b'a = 1\n', '"1"')
+        self.bucket.error = '403'
+        with self.assertRaises(FakeClientError):
+            self.get('a.tfvars')
+        with self.assertRaises(FakeClientError):
+            self.open_provider(cached=False).get('a.tfvars')
+
+    def test_missing_file_without_cache(self) -> None:
+        provider = self.open_provider(cached=False)
+        with self.assertRaises(FileNotFoundError):
+            provider.get('a.tfvars')
+        # A missing file starts out empty for writing
+        self.assertEqual(provider.get_rw('a.tfvars').read_bytes(), b'')
+
+    def test_cache_in_use(self) -> None:
+        # pylint: disable=protected-access
+        provider = self.open_provider()
+        with self.assertRaises(DreamerException):
+            self.open_provider()
+        provider._etags.close()  # type: ignore
+        self.open_provider()._etags.close()  # type: ignore
+
+
+class SnapshotTest(AWSFileProviderTestCase):
+    """Tests for skipping the upload of dirty files that have not changed."""
+
+    def rewrite(self, path: pathlib.Path, data: bytes) -> None:
+        """Write the given data to the file and make sure its modification time changes."""
+        mtime = path.stat().st_mtime_ns + 1_000_000_000
+        path.write_bytes(data)
+        os.utime(path, ns=(mtime, mtime))
+
+    def test_rewritten_file_is_not_modified(self) -> None:
+        self.bucket.put('prefix/mod/proj/a.tfvars', b'a = 1\n', '"1"')
+        provider = self.open_provider(cached=False)
+        path = provider.get_rw('a.tfvars')
+        self.rewrite(path, b'a = 1\n')
+        self.assertFalse(provider._is_modified(path))  # pylint: disable=protected-access
+        # Nothing to upload, so the remote state is not even looked at
+        self.assertTrue(provider.sync())
+        self.rewrite(path, b'a = 2\n')
+        self.assertTrue(provider._is_modified(path))  # pylint: disable=protected-access
+
+    def test_new_file_is_modified(self) -> None:
+        provider = self.open_provider(cached=False)
+        path = provider.get_rw('a.tfvars')
+        self.assertTrue(provider._is_modified(path))  # pylint: disable=protected-access
+
+    def test_rewritten_file_stays_cached(self) -> None:
+        self.bucket.put('prefix/mod/proj/a.tfvars', b'a = 1\n', '"1"')
+        provider = self.open_provider()
+        path = provider.get_rw('a.tfvars')
+        # Make sure the rewrite is newer than the stored ETag, which would otherwise make the cached copy stale
+        os.utime(path.with_name('a.tfvars.etag'), ns=(0, 0))
+        path.write_bytes(b'a = 1\n')
+        provider.sync()
+        provider._etags.close()  # type: ignore  # pylint: disable=protected-access
+        self.get('a.tfvars')
+        self.assertEqual(self.bucket.downloads, 1)
+
+
+class BucketIndexTest(unittest.TestCase):
+    """Tests for `_BucketIndex`."""
+
+    def test_projects_need_metadata(self) -> None:
+        index = _BucketIndex()
+        index.add('proj', 'mod', 'a.tfvars')
+        self.assertEqual(index.get_projects('mod'), [])
+        self.assertEqual(index.get_files('proj', 'mod'), ['a.tfvars'])
+        index.add('proj', 'mod')
+        self.assertEqual(index.get_projects('mod'), ['proj'])
+
+    def test_remove_prunes_empty_entries(self) -> None:
+        index = _BucketIndex()
+        index.add('proj', 'mod')
+        index.add('proj', 'mod', 'a.tfvars')
+        index.remove('proj', 'mod', 'a.tfvars')
+        self.assertEqual(index.get_projects('mod'), ['proj'])
+        index.remove('proj', 'mod')
+        self.assertEqual(index.files, {})
+        self.assertEqual(index.projects, set())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,61 @@
+"""Tests for `dreamer.utils.replace_block_text()` and its helpers."""
+
+import unittest
+
+from dreamer.utils import _find_line, replace_block_text
+
+
+class FindLineTest(unittest.TestCase):
+    """Tests for `_find_line()`."""
+
+    def test_finds_whole_line_only(self) -> None:
+        content = 'x # end: foo\n  # end: foo  \n'
+        self.assertEqual(_find_line(content, '# end: foo'), 13)
+
+    def test_last_line_without_newline(self) -> None:
+        self.assertEqual(_find_line('a\nb', 'b'), 2)
+
+    def test_start(self) -> None:
+        content = 'b\nb\n'
+        self.assertEqual(_find_line(content, 'b', 1), 2)
+
+    def test_missing(self) -> None:
+        self.assertEqual(_find_line('ab\n', 'b'), -1)
+
+
+class ReplaceBlockTextTest(unittest.TestCase):
+    """Tests for `replace_block_text()`."""
+
+    def test_appends_to_empty(self) -> None:
+        self.assertEqual(replace_block_text('', 'foo', 'a\nb'), '# start: foo\na\nb\n# end: foo')
+
+    def test_appends_after_missing_newline(self) -> None:
+        self.assertEqual(replace_block_text('x', 'foo', 'a'), 'x\n# start: foo\na\n# end: foo')
+
+    def test_replaces_block_and_keeps_the_rest(self) -> None:
+        content = 'before\n  # start: foo\nold\n# end: foo  \nafter\n'
+        self.assertEqual(
+            replace_block_text(content, 'foo', 'new\n'),
+            'before\n  # start: foo\nnew\n# end: foo  \nafter\n'
+        )
+
+    def test_other_blocks_untouched(self) -> None:
+        content = '# start: foobar\nx\n# end: foobar\n# start: foo\ny\n# end: foo\n'
+        self.assertEqual(
+            replace_block_text(content, 'foo', 'z'),
+            '# start: foobar\nx\n# end: foobar\n# start: foo\nz\n# end: foo\n'
+        )
+
+    def test_converts_windows_newlines(self) -> None:
+        content = 'a\r\n# start: foo\r\nold\r\n# end: foo\r\n'
+        self.assertEqual(replace_block_text(content, 'foo', 'new'), 'a\n# start: foo\nnew\n# end: foo\n')
+
+    def test_missing_end_line(self) -> None:
+        with self.assertRaises(ValueError):
+            replace_block_text('# start: foo\nold\n', 'foo', 'new')
+        with self.assertRaises(ValueError):
+            replace_block_text('# start: foo', 'foo', 'new')
+
+
+if __name__ == '__main__':
+    unittest.main()
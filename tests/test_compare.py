@@ -0,0 +1,68 @@
+"""Tests for `dreamer.utils.compare()` and its helpers."""
+
+import pathlib
+import tempfile
+import unittest
+
+from dreamer.utils import Comparison, _content_lines, compare
+
+
+class ContentLinesTest(unittest.TestCase):
+    """Tests for `_content_lines()`."""
+
+    def test_strips_and_skips_blank_lines(self) -> None:
+        data = b'  Host a\r\n\n\t  \n    User b  \nPort 22'
+        self.assertEqual(_content_lines(data), [b'Host a', b'User b', b'Port 22'])
+
+    def test_empty(self) -> None:
+        self.assertEqual(_content_lines(b''), [])
+        self.assertEqual(_content_lines(b'\n  \n'), [])
+
+
+class CompareTest(unittest.TestCase):
+    """Tests for `compare()`."""
+
+    def setUp(self) -> None:
+        self._tmp = tempfile.TemporaryDirectory()  # pylint: disable=consider-using-with
+        self.addCleanup(self._tmp.cleanup)
+        self.this = pathlib.Path(self._tmp.name) / 'this'
+        self.that = pathlib.Path(self._tmp.name) / 'that'
+
+    def test_missing_file(self) -> None:
+        self.this.write_bytes(b'a\nb\n')
+        result = compare(self.this, self.that)
+        self.assertEqual(result, Comparison(2, 0, -1, False))
+        self.assertFalse(result.both_exist)
+
+    def test_identical(self) -> None:
+        self.this.write_bytes(b'a\n\nb\n')
+        self.that.write_bytes(b'a\n\nb\n')
+        result = compare(self.this, self.that)
+        self.assertEqual(result, Comparison(3, 3, 2, True))
+        self.assertTrue(result.both_exist)
+
+    def test_contained_block_ignores_whitespace(self) -> None:
+        self.this.write_bytes(b'Host x\n    User y\n')
+        self.that.write_bytes(b'Host a\n  User b\n\nHost x\r\n  User y  \n\n')
+        self.assertEqual(compare(self.this, self.that), Comparison(2, 6, 2, True))
+
+    def test_lines_out_of_order_are_not_contained(self) -> None:
+        self.this.write_bytes(b'Host x\nUser y\n')
+        self.that.write_bytes(b'User y\nHost x\n')
+        self.assertEqual(compare(self.this, self.that), Comparison(2, 2, 2, False))
+
+    def test_scattered_lines_are_a_partial_match(self) -> None:
+        self.this.write_bytes(b'Host x\nUser shared\n')
+        self.that.write_bytes(b'Host a\nUser shared\n')
+        result = compare(self.this, self.that)
+        self.assertEqual(result.matching_lines, 1)
+        self.assertFalse(result.contains_all)
+
+    def test_empty_file_is_contained(self) -> None:
+        self.this.write_bytes(b'\n\n')
+        self.that.write_bytes(b'anything\n')
+        self.assertEqual(compare(self.this, self.that), Comparison(2, 1, 0, True))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,73 @@
+"""Tests for the git helpers of `dreamer.utils`."""
+
+import os
+import pathlib
+import tempfile
+import unittest
+
+from dreamer.utils import _parse_describe, git_branch
+
+
+class GitBranchTest(unittest.TestCase):
+    """Tests for `git_branch()`, using fake git directories."""
+
+    def setUp(self) -> None:
+        self._tmp = tempfile.TemporaryDirectory()  # pylint: disable=consider-using-with
+        self.addCleanup(self._tmp.cleanup)
+        self.root = pathlib.Path(self._tmp.name).resolve()
+        self.addCleanup(os.chdir, os.getcwd())
+        os.chdir(self.root)
+
+    def make_git_dir(self, path: pathlib.Path, head: str) -> None:
+        """Create a fake git directory with the given HEAD contents."""
+        path.mkdir(parents=True)
+        (path / 'HEAD').write_text(head)
+
+    def test_branch(self) -> None:
+        self.make_git_dir(self.root / '.git', 'ref: refs/heads/feature/x\n')
+        self.assertEqual(git_branch(), 'feature/x')
+
+    def test_detached_head(self) -> None:
+        self.make_git_dir(self.root / '.git', '0123456789abcdef0123456789abcdef01234567\n')
+        self.assertEqual(git_branch(), 'HEAD')
+
+    def test_parent_directory(self) -> None:
+        self.make_git_dir(self.root / '.git', 'ref: refs/heads/main\n')
+        subdir = self.root / 'a' / 'b'
+        subdir.mkdir(parents=True)
+        os.chdir(subdir)
+        self.assertEqual(git_branch(), 'main')
+
+    def test_gitdir_file(self) -> None:
+        self.make_git_dir(self.root / 'repo' / '.git' / 'worktrees' / 'wt', 'ref: refs/heads/wt-branch\n')
+        worktree = self.root / 'wt'
+        worktree.mkdir()
+        (worktree / '.git').write_text('gitdir: ../repo/.git/worktrees/wt\n')
+        os.chdir(worktree)
+        self.assertEqual(git_branch(), 'wt-branch')
+        (worktree / '.git').write_text(f'gitdir: {self.root}/repo/.git/worktrees/wt\n')
+        self.assertEqual(git_branch(), 'wt-branch')
+
+    def test_invalid_git_file(self) -> None:
+        (self.root / '.git').write_text('garbage\n')
+        self.assertIsNone(git_branch())
+
+
+class ParseDescribeTest(unittest.TestCase):
+    """Tests for `_parse_describe()`."""
+
+    def test_at_tag(self) -> None:
+        self.assertEqual(_parse_describe('v1.0-0-gabc1234'), ('v1.0', 'abc1234'))
+
+    def test_after_tag(self) -> None:
+        self.assertEqual(_parse_describe('v1.0-3-gabc1234'), (None, 'abc1234'))
+
+    def test_tag_with_dashes(self) -> None:
+        self.assertEqual(_parse_describe('release-2-rc-0-gabc12345'), ('release-2-rc', 'abc12345'))
+
+    def test_no_tags(self) -> None:
+        self.assertEqual(_parse_describe('abc1234'), (None, 'abc1234'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,59 @@
+"""Tests for the argv and command line construction of `dreamer.runconfig`."""
+
+import unittest
+
+from dreamer.runconfig import RunConfig, TerraformRunConfig
+
+
+class RunConfigTest(unittest.TestCase):
+    """Tests for `RunConfig`."""
+
+    def test_argv_keeps_arguments_intact(self) -> None:
+        config = RunConfig(['-i', 'inventory file']).with_arguments('-e', 'a=b c', '$HOME')
+        self.assertEqual(
+            config.get_argv('ansible-playbook', 'play book.yml'),
+            ['ansible-playbook', '-i', 'inventory file', '-e', 'a=b c', '$HOME', 'play book.yml']
+        )
+
+    def test_cmdline_quotes_arguments_and_environment(self) -> None:
+        config = RunConfig(['-x', 'a b'], {'FOO': 'bar baz'})
+        self.assertEqual(config.get_cmdline('cmd', '> out.txt'), "FOO='bar baz' cmd -x 'a b' > out.txt")
+        self.assertEqual(RunConfig(['-x']).get_cmdline('cmd'), 'cmd -x')
+
+    def test_child_run_config_environment(self) -> None:
+        config = RunConfig(environment={'ARGS': RunConfig(['-o', 'a b'])}).with_child_arguments('ARGS', '-v')
+        self.assertEqual(config.get_env(), {'ARGS': "-o 'a b' -v"})
+        self.assertEqual(config.get_environment(), 'ARGS=\'-o \'"\'"\'a b\'"\'"\' -v\'')
+
+    def test_union(self) -> None:
+        config = RunConfig(['-a'], {'X': '1', 'Y': '2'}) | RunConfig(['-b'], {'Y': '3'})
+        self.assertEqual(config.get_argv('cmd'), ['cmd', '-a', '-b'])
+        self.assertEqual(config.get_env(), {'X': '1', 'Y': '3'})
+
+
+class TerraformRunConfigTest(unittest.TestCase):
+    """Tests for `TerraformRunConfig`."""
+
+    def setUp(self) -> None:
+        self.config = (
+            TerraformRunConfig(environment={'TF_IN_AUTOMATION': '1'})
+            .with_global_arguments('-chdir=/path with spaces')
+            .with_arguments('-var-file=a b.tfvars', '-input=false')
+        )
+
+    def test_argv_places_global_arguments_before_subcommand(self) -> None:
+        self.assertEqual(
+            self.config.get_argv('terraform', 'plan', '-out=plan file'),
+            ['terraform', '-chdir=/path with spaces', 'plan', '-var-file=a b.tfvars', '-input=false', '-out=plan file']
+        )
+
+    def test_cmdline(self) -> None:
+        self.assertEqual(self.config.get_global_arguments(), "'-chdir=/path with spaces'")
+        self.assertEqual(
+            self.config.get_cmdline('terraform', 'apply', 'plan'),
+            "TF_IN_AUTOMATION=1 terraform '-chdir=/path with spaces' apply '-var-file=a b.tfvars' -input=false plan"
+        )
+
+
+if __name__ == '__main__':
+    unittest.main()
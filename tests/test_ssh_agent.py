@@ -0,0 +1,81 @@
+"""Tests for `dreamer.utils.ssh_agent_identity_count()`, using a fake SSH agent."""
+
+import socket
+import struct
+import tempfile
+import threading
+import time
+import unittest
+from typing import List, Optional
+
+from dreamer.utils import ssh_agent_identity_count
+
+
+class SSHAgentTest(unittest.TestCase):
+    """Tests for talking to the SSH agent over its socket."""
+
+    def setUp(self) -> None:
+        self._tmp = tempfile.TemporaryDirectory()  # pylint: disable=consider-using-with
+        self.addCleanup(self._tmp.cleanup)
+        self.socket_path = f'{self._tmp.name}/agent.sock'
+        self.requests: List[bytes] = []
+
+    def serve(self, *chunks: bytes, hold: Optional[threading.Event] = None) -> None:
+        """
+        Start a fake agent that answers one request by sending the given chunks and closing the connection, after the
+        `hold` event is set if one is given.
+        """
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.addCleanup(server.close)
+        server.bind(self.socket_path)
+        server.listen(1)
+
+        def handle() -> None:
+            conn, _ = server.accept()
+            with conn:
+                self.requests.append(conn.recv(5))
+                for chunk in chunks:
+                    conn.sendall(chunk)
+                    # Give the client a chance to see each chunk separately
+                    time.sleep(0.01)
+                if hold is not None:
+                    hold.wait(5)
+
+        thread = threading.Thread(target=handle, daemon=True)
+        thread.start()
+        self.addCleanup(thread.join, 5)
+
+    def test_identities_answer(self) -> None:
+        # Only the header and the count are read, the keys themselves are ignored
+        reply = struct.pack('>IBI', 5 + 100, 12, 2) + b'k' * 100
+        self.serve(reply[:3], reply[3:7], reply[7:])
+        self.assertEqual(ssh_agent_identity_count(self.socket_path), 2)
+        self.assertEqual(self.requests, [struct.pack('>IB', 1, 11)])
+
+    def test_no_identities(self) -> None:
+        self.serve(struct.pack('>IBI', 5, 12, 0))
+        self.assertEqual(ssh_agent_identity_count(self.socket_path), 0)
+
+    def test_failure_reply(self) -> None:
+        # SSH_AGENT_FAILURE has no body, so the agent sends nothing more but keeps the connection open
+        hold = threading.Event()
+        self.serve(struct.pack('>IB', 1, 5), hold=hold)
+        # Cleanups run in reverse order, so the agent is released before its thread is joined
+        self.addCleanup(hold.set)
+        start = time.monotonic()
+        with self.assertRaises(ValueError):
+            ssh_agent_identity_count(self.socket_path)
+        self.assertLess(time.monotonic() - start, 1)
+
+    def test_connection_closed(self) -> None:
+        self.serve(struct.pack('>IB', 5, 12))
+        with self.assertRaises(ValueError):
+            ssh_agent_identity_count(self.socket_path)
+
+    def test_no_agent(self) -> None:
+        with self.assertRaises(OSError):
+            ssh_agent_identity_count(self.socket_path)
+
+
+if __name__ == '__main__':
+    unittest.main()